@@ -0,0 +1,200 @@
+import concurrent.futures
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import pygame
+import rotation_cache
+
+
+# cache file format, bump when the layout changes
+CACHE_VERSION = 1
+
+
+def _bake(path, angles):
+    """Decode an image and rotate it, runs in a worker process.
+
+    Arguments:
+        path {str} -- image file
+        angles {list: float} -- rotation angles in degrees, the image itself if empty
+
+    Returns:
+        list -- (angle, size, RGBA bytes) of the image, angle is None, or of its rotations"""
+
+    image = pygame.image.load(path)
+    if not angles:
+        return [(None, image.get_size(), pygame.image.tobytes(image, "RGBA"))]
+    variants = []
+    for angle in angles:
+        rotated = pygame.transform.rotate(image, angle)
+        variants.append((angle, rotated.get_size(), pygame.image.tobytes(rotated, "RGBA")))
+    return variants
+
+
+def _file_hash(path):
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+class Assets:
+    """Image registry, every image is loaded and converted once and shared by all objects.
+    Decoded images and the rotations of the spinning ones are stored in a raw RGBA cache
+    file, memory mapped on the next start and rebuilt across a process pool when a source
+    image, the rotation resolution or the cache version changes.
+
+    Arguments:
+        directory {str} -- images directory
+        cache_path {str} -- cache file, the index is stored next to it as .json, None disables it
+        rotated {tuple: str} -- images whose rotations are cached, one per rotation cache bucket
+        workers {int} -- processes used to build the cache, default is the cpu count"""
+
+    def __init__(self, directory="Images", cache_path=os.path.join(".cache", "assets.bin"),
+                 rotated=("asteroid.png", "missile.png", "bullet.png"), workers=None):
+        self._directory = directory
+        self._cache_path = cache_path
+        self._rotated = rotated
+        self._workers = workers
+        self._surfaces = {} # name -> converted surface
+        self._names = {} # surface -> name
+        self._index = {}
+        self._pixels = None # memory mapped cache
+        if cache_path:
+            self._open_cache()
+
+    def _sources(self):
+        return sorted(name for name in os.listdir(self._directory) if name.endswith(".png"))
+
+    def _expected(self):
+        """Cache index header matching the current sources and settings"""
+
+        return {"version": CACHE_VERSION,
+                "resolution": rotation_cache.cache.resolution,
+                "hashes": {name: _file_hash(os.path.join(self._directory, name))
+                           for name in self._sources()},
+                "rotated": sorted(self._rotated)}
+
+    def _open_cache(self):
+        """Map the cache file, rebuilding it when missing or stale"""
+
+        index_path = os.path.splitext(self._cache_path)[0] + ".json"
+        expected = self._expected()
+        try:
+            with open(index_path) as file:
+                index = json.load(file)
+            valid = all(index[key] == value for key, value in expected.items())
+        except (OSError, ValueError, KeyError):
+            valid = False
+        if not valid:
+            index = self.build_cache(expected, index_path)
+
+        with open(self._cache_path, "rb") as file:
+            self._pixels = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index = index["images"]
+
+    def build_cache(self, header, index_path):
+        """Decode and rotate every source image across a process pool and write the cache.
+        A daemonic process can not start the pool, it decodes the images itself.
+
+        Arguments:
+            header {dict} -- index header, see _expected
+            index_path {str} -- index file
+
+        Returns:
+            dict -- cache index"""
+
+        buckets = round(360 / header["resolution"])
+        angles = [bucket * header["resolution"] for bucket in range(buckets)]
+        tasks = []
+        for name in header["hashes"]:
+            path = os.path.join(self._directory, name)
+            tasks.append((name, path, []))
+            if name in self._rotated:
+                # rotations are split in chunks to spread them on the workers
+                tasks.extend((name, path, angles[start:start + 45])
+                             for start in range(0, len(angles), 45))
+
+        arguments = zip(*[(path, chunk) for name, path, chunk in tasks])
+        if multiprocessing.current_process().daemon:
+            # daemonic processes, e.g. multiprocessing pool workers, can not have children
+            images = self._write_cache(header, tasks, map(_bake, *arguments))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(self._workers) as pool:
+                images = self._write_cache(header, tasks, pool.map(_bake, *arguments))
+
+        index = dict(header, images=images)
+        with open(index_path + ".tmp", "w") as file:
+            json.dump(index, file)
+        os.replace(index_path + ".tmp", index_path)
+        return index
+
+    def _write_cache(self, header, tasks, results):
+        """Write the baked images to the cache file, in task order
+
+        Arguments:
+            header {dict} -- index header, see _expected
+            tasks {list: tuple} -- (name, path, angles) of each _bake call
+            results {iterable} -- _bake results of the tasks
+
+        Returns:
+            dict -- name -> size, offset and rotations of the image"""
+
+        images = {name: {"size": None, "offset": None, "rotations": []} for name in header["hashes"]}
+        os.makedirs(os.path.dirname(self._cache_path) or ".", exist_ok=True)
+        offset = 0
+        with open(self._cache_path + ".tmp", "wb") as file:
+            for (name, path, chunk), variants in zip(tasks, results):
+                for angle, size, pixels in variants:
+                    entry = {"size": size, "offset": offset}
+                    if angle is None:
+                        images[name].update(entry)
+                    else:
+                        images[name]["rotations"].append(dict(entry, angle=angle))
+                    file.write(pixels)
+                    offset += len(pixels)
+        os.replace(self._cache_path + ".tmp", self._cache_path)
+        return images
+
+    def _from_cache(self, entry):
+        size = entry["size"]
+        length = size[0] * size[1] * 4
+        return pygame.image.frombuffer(self._pixels[entry["offset"]:entry["offset"] + length],
+                                       size, "RGBA").convert_alpha()
+
+    def load(self, name):
+        """Converted image, loaded on first request and shared afterwards.
+        Cached rotations of the image are handed to the rotation cache.
+
+        Arguments:
+            name {str} -- file name in the images directory
+
+        Returns:
+            object -- pygame surface"""
+
+        surface = self._surfaces.get(name)
+        if surface is not None:
+            return surface
+
+        entry = self._index.get(name)
+        if entry is not None:
+            surface = self._from_cache(entry)
+            for rotation in entry["rotations"]:
+                rotation_cache.cache.preload(surface, rotation["angle"], self._from_cache(rotation))
+        else:
+            surface = pygame.image.load(os.path.join(self._directory, name)).convert_alpha()
+        self._surfaces[name] = surface
+        self._names[surface] = name
+        return surface
+
+    def name_of(self, surface):
+        """Name of a surface returned by load, None for other surfaces"""
+
+        return self._names.get(surface)
+
+    def surfaces(self):
+        """Surfaces loaded so far
+
+        Returns:
+            list -- pygame surfaces"""
+
+        return list(self._surfaces.values())
@@ -0,0 +1,299 @@
+"""Deterministic headless benchmark of the game loop.
+
+Every scenario runs TestGame under SDL dummy video driver with a seeded random module,
+the fixed simulation step and scripted key input, then frame and phase time percentiles,
+sprite counts and peak memory are reported as JSON. Each scenario runs in a fresh process
+so its peak memory is its own.
+
+    python3 benchmark.py --output results.json
+    python3 benchmark.py --baseline baseline.json --save-baseline
+    python3 benchmark.py --baseline baseline.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import resource
+import sys
+import traceback
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1") # keep stdout valid JSON
+
+import numpy
+import pygame
+import game_mode
+import latency
+import mask_cache
+import rotation_cache
+
+
+# metrics compared against the baseline
+COMPARED = ("p50", "p90", "p99")
+
+
+class ScriptedKeys:
+    """Pressed keys replacement of pygame.key.get_pressed
+
+    Arguments:
+        pressed {iterable: int} -- pygame key constants held down"""
+
+    def __init__(self, pressed=()):
+        self._pressed = frozenset(pressed)
+
+    def __getitem__(self, key):
+        return key in self._pressed
+
+
+NO_KEYS = ScriptedKeys()
+
+
+def _asteroids(count):
+    def setup(game):
+        for x in range(count):
+            game.add_asteroid([random.randint(100, game.map_size[0] - 100),
+                               random.randint(100, game.map_size[1] - 100)],
+                              [random.uniform(-3, 3), random.uniform(-3, 3)])
+    return setup
+
+
+def _ai_ships(count):
+    def setup(game):
+        for x in range(count):
+            game.add_ai_ship()
+    return setup
+
+
+def _hold(*keys):
+    pressed = ScriptedKeys(keys)
+    return lambda frame: pressed
+
+
+def _cycle(period, *keys):
+    """One key of keys held at a time, the next one every period frames"""
+
+    pressed = [ScriptedKeys((key,)) for key in keys]
+    return lambda frame: pressed[frame // period % len(pressed)]
+
+
+def _mass_explosion(game, frame):
+    if frame % 60 == 10:
+        for asteroid in game.asteroids.sprites():
+            asteroid.explode()
+        _asteroids(200)(game)
+
+
+# name -> (setup(game), keys(frame), every_frame(game, frame))
+SCENARIOS = {
+    "idle": (None, None, None),
+    "asteroids_500": (_asteroids(480), None, None),
+    "bullet_fire": (_asteroids(100), _hold(pygame.K_SPACE, pygame.K_LEFT), None),
+    "missile_salvo": (_asteroids(100), _hold(pygame.K_LSHIFT, pygame.K_RIGHT), None),
+    "mass_explosion": (_asteroids(200), None, _mass_explosion),
+    "ai_fleet_500": (_ai_ships(500), None, None),
+    "controls": (_asteroids(200), _cycle(10, pygame.K_UP, pygame.K_LEFT, pygame.K_SPACE,
+                                         pygame.K_RIGHT, pygame.K_DOWN, pygame.K_LSHIFT), None),
+}
+
+
+def _percentiles(values):
+    values = numpy.asarray(values) * 1000 # ms
+    return {"mean": float(values.mean()),
+            "p50": float(numpy.percentile(values, 50)),
+            "p90": float(numpy.percentile(values, 90)),
+            "p99": float(numpy.percentile(values, 99)),
+            "max": float(values.max())}
+
+
+def run_scenario(name, frames=600, warmup=60, seed=0, trace_memory=False, precise=False,
+                 latency_log=None):
+    """Play a scenario and measure it.
+
+    Arguments:
+        name {str} -- key of SCENARIOS
+        frames {int} -- measured frames
+        warmup {int} -- frames played before measuring
+        seed {int} -- random seed
+        trace_memory {bool} -- report python peak memory with tracemalloc, slower
+        precise {bool} -- pixel accurate collisions
+        latency_log {str} -- trace input latency, one CSV line per input in this file
+
+    Returns:
+        dict -- scenario results"""
+
+    setup, keys, every_frame = SCENARIOS[name]
+    random.seed(seed)
+    rotation_cache.cache.clear()
+    mask_cache.cache.clear()
+    if trace_memory:
+        tracemalloc.start()
+
+    game = game_mode.TestGame((2500, 2500), (1300, 800), False)
+    game.profiler.enabled = True
+    game.precise_collisions = precise
+    if latency_log:
+        game.latency = latency.LatencyTracer(latency_log)
+    if setup:
+        setup(game)
+
+    frame_times = []
+    phase_times = {}
+    entity_times = {}
+    peak_sprites = peak_particles = 0
+    for frame in range(warmup + frames):
+        if every_frame:
+            every_frame(game, frame)
+        game.profiler.begin_frame()
+        game.tick(keys(frame) if keys else NO_KEYS)
+        game.profiler.end_frame()
+        pygame.event.pump()
+        if frame < warmup:
+            continue
+        measured = game.profiler.frames[-1]
+        frame_times.append(measured["time"])
+        for phase, value in measured["phases"].items():
+            phase_times.setdefault(phase, []).append(value)
+        for entity, value in measured["entities"].items():
+            entity_times.setdefault(entity, []).append(value)
+        peak_sprites = max(peak_sprites, len(game.all))
+        peak_particles = max(peak_particles, len(game.particles))
+
+    result = {"frames": frames,
+              "frame_ms": _percentiles(frame_times),
+              "phases_ms": {phase: _percentiles(values) for phase, values in phase_times.items()},
+              "entities_ms": {entity: _percentiles(values) for entity, values in entity_times.items()},
+              "sprites": {"final": len(game.all), "peak": peak_sprites},
+              "particles": {"final": len(game.particles), "peak": peak_particles},
+              "rotation_cache": rotation_cache.cache.stats(),
+              "mask_cache": mask_cache.cache.stats(),
+              "pools": {"bullets": game.bullet_pool.stats(), "missiles": game.missile_pool.stats()},
+              "particle_system": game.particles.stats(),
+              "director": game.director.stats(),
+              "lod": game.lod.stats(),
+              "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    if latency_log:
+        game.latency.close()
+        result["latency_ms"] = game.latency.report()
+    if trace_memory:
+        result["peak_traced_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return result
+
+
+def _run_isolated(name, options, results):
+    """run_scenario in the current process, a fresh one started by main. The result, or the
+    traceback of the failure, is put in the results queue"""
+
+    pygame.init()
+    try:
+        results.put((run_scenario(name, **options), None))
+    except Exception:
+        results.put((None, traceback.format_exc()))
+    finally:
+        pygame.quit()
+
+
+def _run_process(context, name, options):
+    """Result of run_scenario in a new process of the multiprocessing context, not a pool
+    worker: workers are daemonic and the asset cache is built across child processes"""
+
+    results = context.Queue()
+    process = context.Process(target=_run_isolated, args=(name, options, results))
+    process.start()
+    while True:
+        try:
+            result, error = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                result, error = None, "exit code %s" % process.exitcode
+                break
+    process.join()
+    if error is not None:
+        raise RuntimeError("scenario %s failed: %s" % (name, error))
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Frame time regressions against a baseline.
+
+    Arguments:
+        results {dict} -- current results
+        baseline {dict} -- saved results
+        tolerance {float} -- allowed slowdown ratio, 0.15 is 15%
+
+    Returns:
+        list -- regression descriptions"""
+
+    regressions = []
+    for name, result in results["scenarios"].items():
+        saved = baseline["scenarios"].get(name)
+        if saved is None:
+            continue
+        for metric in COMPARED:
+            now, before = result["frame_ms"][metric], saved["frame_ms"][metric]
+            if now > before * (1 + tolerance):
+                regressions.append("%s frame %s: %.3f ms -> %.3f ms (+%.0f%%)" %
+                                   (name, metric, before, now, (now / before - 1) * 100))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run, can be repeated (default: all)")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--warmup", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="report python peak memory per scenario, slows the game down")
+    parser.add_argument("--precise", action="store_true", help="pixel accurate collisions")
+    parser.add_argument("--latency", metavar="PREFIX",
+                        help="trace input latency, logged to PREFIX_<scenario>.csv")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="baseline JSON file to compare with")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="write results to the baseline file instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="allowed frame time increase before a regression is reported")
+    args = parser.parse_args(argv)
+
+    results = {"seed": args.seed, "frames": args.frames, "scenarios": {}}
+    # spawned, not forked: peak_rss_kb does not include the parent or earlier scenarios
+    context = multiprocessing.get_context("spawn")
+    for name in args.scenario or SCENARIOS:
+        options = {"frames": args.frames, "warmup": args.warmup, "seed": args.seed,
+                   "trace_memory": args.trace_memory, "precise": args.precise,
+                   "latency_log": args.latency and "%s_%s.csv" % (args.latency, name)}
+        results["scenarios"][name] = _run_process(context, name, options)
+        frame_ms = results["scenarios"][name]["frame_ms"]
+        print("%-16s p50 %7.3f ms  p99 %7.3f ms" % (name, frame_ms["p50"], frame_ms["p99"]),
+              file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as file:
+            file.write(output)
+    elif args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression, file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
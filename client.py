@@ -0,0 +1,243 @@
+import argparse
+import asyncio
+import collections
+import time
+import pygame
+import game_mode
+import netcode
+import player_object
+import replay
+import rotation_cache
+import starfield
+
+
+# keys whose effect only comes from the server, they are not predicted
+_SERVER_KEYS = (1 << replay.KEYS.index(pygame.K_SPACE) |
+                1 << replay.KEYS.index(pygame.K_LSHIFT) |
+                1 << replay.KEYS.index(pygame.K_a))
+
+
+class Client(asyncio.DatagramProtocol):
+    """Network side of a client: hello, inputs and snapshots decoding.
+    Received snapshots are kept until the server uses a newer one as delta baseline.
+
+    Arguments:
+        screen_size {tuple: int} -- client screen size, the server sends what is in view
+        history {int} -- max number of received snapshots kept as baselines"""
+
+    def __init__(self, screen_size, history=64):
+        self._screen_size = screen_size
+        self._history = collections.OrderedDict() # sequence -> state
+        self._history_size = history
+        self._transport = None
+        self._masks = collections.deque(maxlen=netcode.INPUT_REDUNDANCY) # newest first
+        self.welcome = None
+        self.connected = asyncio.Event()
+        self.header = None # last snapshot header
+        self.state = {} # id -> network state of the last snapshot
+        self.previous_state = {}
+        self.received_at = 0.0
+        self.input_sequence = 0
+        self.snapshots = 0
+        self.dropped = 0 # snapshots with an unknown baseline or out of order
+        self.bytes_received = 0
+        self.bytes_sent = 0
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self.hello()
+
+    def hello(self):
+        self._send(netcode.encode_hello(self._screen_size))
+
+    def _send(self, data):
+        self.bytes_sent += len(data)
+        self._transport.sendto(data)
+
+    def datagram_received(self, data, address):
+        self.bytes_received += len(data)
+        if data[0] == netcode.WELCOME:
+            self.welcome = netcode.decode_welcome(data)
+            self.connected.set()
+        elif data[0] == netcode.SNAPSHOT:
+            decoded = netcode.decode_snapshot(data, self._history)
+            if decoded is None or (self.header and decoded[0]["sequence"] <= self.header["sequence"]):
+                self.dropped += 1
+                return
+            self.header, state = decoded
+            self._history[self.header["sequence"]] = state
+            while len(self._history) > self._history_size:
+                self._history.popitem(last=False)
+            self.previous_state, self.state = self.state, state
+            self.received_at = time.perf_counter()
+            self.snapshots += 1
+            self.on_snapshot(self.header)
+
+    def on_snapshot(self, header):
+        """Called for every new snapshot"""
+
+    def send_input(self, mask):
+        """Send the keys of the next tick, with the previous ones against losses
+
+        Arguments:
+            mask {int} -- key mask, see replay.key_mask
+
+        Returns:
+            int -- input sequence"""
+
+        self.input_sequence += 1
+        self._masks.appendleft(mask)
+        ack = self.header["sequence"] if self.header else 0
+        self._send(netcode.encode_input(self.input_sequence, ack, list(self._masks)))
+        return self.input_sequence
+
+    def close(self):
+        if self._transport is not None:
+            self._send(bytes((netcode.BYE,)))
+            self._transport.close()
+
+
+class GameClient(Client):
+    """Playable client. The own ship is predicted from the local keys and reconciled with
+    every snapshot: it is moved to the server state and the inputs the server has not
+    processed yet are applied again. Other entities are interpolated between the last
+    two snapshots.
+
+    Arguments:
+        screen_size {tuple: int} -- window size"""
+
+    def __init__(self, screen_size):
+        super().__init__(screen_size)
+        self.game = None
+        self.ship = None
+        self._pending = collections.deque() # (sequence, mask) not processed by the server
+        self._images = []
+
+    def start(self):
+        """Build the local game once welcomed"""
+
+        welcome = self.welcome
+        self.game = game = game_mode.Game(welcome["map_size"], self._screen_size, False)
+        game.sim_rate = welcome["sim_rate"]
+        game.delta_time = 30 / (1000 / game.sim_rate)
+        game.starry_sky.add(starfield.Starfield(game, welcome["seed"]))
+        self._images = [game.assets.load(name) for name in netcode.KINDS]
+        self.ship = player_object.Ship(game, game.assets.load("ship.png"), [0, 0],
+                                       camera_mode="scrolling", controlled=True,
+                                       need_max_rect=False, **netcode.SHIP)
+        pygame.display.set_caption("Shooter - client %d" % welcome["client_id"])
+
+    def _predict(self, mask):
+        self.ship.update(replay.MaskKeys(mask & ~_SERVER_KEYS))
+
+    def on_snapshot(self, header):
+        if self.ship is None:
+            return
+        ship = self.ship
+        ship._position[0], ship._position[1] = header["position"]
+        ship._speed = list(header["speed"])
+        ship._angle = header["angle"]
+        ship._need_update = True
+        while self._pending and self._pending[0][0] <= header["input_sequence"]:
+            self._pending.popleft()
+        # the replayed inputs already emitted their trails when first predicted
+        ship._trails = False
+        for sequence, mask in self._pending:
+            self._predict(mask)
+        ship._trails = True
+
+    def tick(self, keys):
+        """Send and predict the keys of one simulation step"""
+
+        mask = replay.key_mask(keys)
+        self._pending.append((self.send_input(mask), mask))
+        self._predict(mask)
+        self.game.particles.update()
+
+    def render(self):
+        game = self.game
+        game.update_camera()
+        renderer = game.renderer
+        renderer.begin()
+        game.draw_group(game.starry_sky)
+
+        # map edges
+        renderer.draw_rect((255, 0, 0), pygame.Rect(game.screen_size[0] / 2 - game.camera_x,
+                                                    game.screen_size[1] / 2 - game.camera_y,
+                                                    game.map_size[0], game.map_size[1]), 20)
+
+        # other entities, between the last two snapshots
+        interval = self.welcome["snapshot_interval"] / game.sim_rate
+        alpha = min(1.0, (time.perf_counter() - self.received_at) / interval)
+        blits = []
+        for identifier, state in self.state.items():
+            x, y, angle = netcode.dequantize(state)
+            previous = self.previous_state.get(identifier)
+            if previous is not None:
+                old_x, old_y, old_angle = netcode.dequantize(previous)
+                x, y = old_x + (x - old_x) * alpha, old_y + (y - old_y) * alpha
+                angle = old_angle + ((angle - old_angle + 180) % 360 - 180) * alpha
+            image = rotation_cache.cache.rotate(self._images[state[0]], angle)[0]
+            blits.append((image, (int(x - game.camera_x + game.screen_size[0] / 2 - image.get_width() / 2),
+                                  int(y - game.camera_y + game.screen_size[1] / 2 - image.get_height() / 2))))
+        renderer.blits(blits)
+
+        renderer.draw_sprites([self.ship])
+        game.particles.draw(1.0)
+        renderer.blits(game.text.glyphs(
+            " Life: %d, entities in view: %d, %.1f kB/s down, fps: %.1f" %
+            (self.header["life"] if self.header else 0, len(self.state),
+             self.bytes_received / 1024 / max(time.perf_counter() - self._start, 1e-9),
+             game.clock.get_fps()), (0, 0)))
+        renderer.present()
+
+    async def play(self):
+        """Client loop: events, keys, prediction and rendering at the simulation rate"""
+
+        await asyncio.wait_for(self.connected.wait(), 5.0)
+        self.start()
+        self._start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        step_time = 1 / self.game.sim_rate
+        next_time = loop.time()
+        while True:
+            if any(event.type == pygame.QUIT for event in pygame.event.get()):
+                break
+            self.tick(pygame.key.get_pressed())
+            self.render()
+            self.game.clock.tick()
+            next_time = max(next_time + step_time, loop.time() - step_time)
+            await asyncio.sleep(max(0.0, next_time - loop.time()))
+
+
+async def connect(protocol, host, port):
+    """Connect protocol {object} to the server, hello is resent until welcomed"""
+
+    loop = asyncio.get_running_loop()
+    await loop.create_datagram_endpoint(lambda: protocol, remote_addr=(host, port))
+    for attempt in range(10):
+        try:
+            await asyncio.wait_for(asyncio.shield(protocol.connected.wait()), 0.5)
+            return protocol
+        except asyncio.TimeoutError:
+            protocol.hello()
+    raise ConnectionError("no answer from %s:%d" % (host, port))
+
+
+async def main(host, port, screen_size):
+    client = await connect(GameClient(screen_size), host, port)
+    try:
+        await client.play()
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shooter client")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    args = parser.parse_args()
+
+    pygame.init()
+    asyncio.run(main(args.host, args.port, (1300, 800)))
+    pygame.quit()
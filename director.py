@@ -0,0 +1,184 @@
+import collections
+import random
+import numpy
+
+
+class _Kind:
+    """Settings of a spawnable kind, see SpawnDirector.register"""
+
+    def __init__(self, factory, tag, budget, exclusions, interval):
+        self.factory = factory
+        self.tag = tag
+        self.budget = budget
+        self.exclusions = exclusions
+        self.interval = interval
+        self.timer = 0.0
+
+
+class SpawnDirector:
+    """Spawns game objects at valid positions and within population budgets.
+    The map is split in cells: a position is drawn directly among the cells which are fully
+    outside of the exclusion zones, then inside the cell, so there is no retry loop.
+    Spawns are queued and at most max_per_tick of them run each step, waves of many
+    objects are spread over the next ticks instead of making a frame spike.
+
+    Arguments:
+        game {object} -- game instance
+        cell_size {int} -- side of the sampling cells in pixels
+        max_per_tick {int} -- spawns run each step, the others wait in the queue
+        particle_budget {int} -- max live particles, None keeps the particle system capacity"""
+
+    def __init__(self, game, cell_size=50, max_per_tick=2, particle_budget=None):
+        self._game = game
+        self._cell_size = cell_size
+        self._max_per_tick = max_per_tick
+        self._kinds = {} # name -> kind settings
+        self._queue = collections.deque() # kind names waiting to spawn
+        self._waves = [] # (tick, kind, count) sorted by tick
+        self._wave = 0 # next wave
+        self.tick = 0
+        self.spawned = 0
+        self.over_budget = 0 # requests dropped because the population was full
+        self.no_space = 0 # requests dropped because every cell was excluded
+        if particle_budget is not None:
+            game.particles.budget = particle_budget
+
+        # centers of the cells inside the playable area
+        bounds = game.bounds
+        half = cell_size / 2
+        x = numpy.arange(bounds.left + half, bounds.right - half + 1, cell_size)
+        y = numpy.arange(bounds.top + half, bounds.bottom - half + 1, cell_size)
+        self._centers = numpy.stack(numpy.meshgrid(x, y), axis=-1).reshape(-1, 2)
+
+    def register(self, name, factory, tag, budget=None, exclusions=(), interval=None):
+        """Declare a spawnable kind.
+
+        Arguments:
+            name {str} -- kind name used by requests and waves
+            factory {function} -- factory(position) spawns the object
+            tag {str} -- entity tag counted against the budget
+            budget {int} -- max live objects with tag, None is unbounded
+            exclusions {tuple} -- (game attribute, radius) pairs, no spawn closer than
+                                  radius to the position of the game object
+            interval {float} -- one spawn every interval ticks of 30 ms, None for none"""
+
+        self._kinds[name] = _Kind(factory, tag, budget, tuple(exclusions), interval)
+
+    def schedule(self, tick, name, count):
+        """Scripted wave: request count {int} objects of kind name {str} at tick {int}.
+        Raises ValueError when the kind is not registered"""
+
+        self._check(name)
+        self._waves.append((tick, name, count))
+        self._waves.sort(key=lambda wave: wave[0])
+
+    def waves(self):
+        """Scheduled waves
+
+        Returns:
+            list -- (tick, kind name, count) sorted by tick"""
+
+        return list(self._waves)
+
+    def request(self, name, count=1):
+        """Queue count {int} spawns of kind name {str}, raises ValueError when the kind is
+        not registered"""
+
+        self._check(name)
+        self._queue.extend([name] * count)
+
+    def _check(self, name):
+        if name not in self._kinds:
+            raise ValueError("unknown spawn kind %r, kinds: %s" % (name, ", ".join(self._kinds)))
+
+    def sample(self, exclusions):
+        """Random position at least radius away from every excluded object.
+
+        Arguments:
+            exclusions {tuple} -- (game attribute, radius) pairs
+
+        Returns:
+            list -- [x, y] position, None when no cell is left"""
+
+        centers = self._centers
+        half = self._cell_size / 2
+        valid = numpy.ones(len(centers), bool)
+        for attribute, radius in exclusions:
+            position = getattr(self._game, attribute)._position
+            # distance from the center of the zone to the nearest point of each cell
+            nearest = numpy.maximum(numpy.abs(centers - position) - half, 0)
+            valid &= (nearest ** 2).sum(axis=1) >= radius ** 2
+        cells = numpy.flatnonzero(valid)
+        if not len(cells):
+            return None
+        x, y = centers[cells[random.randrange(len(cells))]]
+        return [float(x) + random.uniform(-half, half), float(y) + random.uniform(-half, half)]
+
+    def spawn(self, name):
+        """Spawn an object of kind name {str} now, within its budget
+
+        Returns:
+            object -- the factory result, None when over budget or without space"""
+
+        kind = self._kinds[name]
+        if kind.budget is not None and self._game.entities.count(kind.tag) >= kind.budget:
+            self.over_budget += 1
+            return None
+        position = self.sample(kind.exclusions)
+        if position is None:
+            self.no_space += 1
+            return None
+        self.spawned += 1
+        return kind.factory(position)
+
+    def update(self):
+        """One simulation step: interval spawns and waves are queued, then the queue head
+        is spawned"""
+
+        for name, kind in self._kinds.items():
+            if kind.interval is not None:
+                kind.timer += 1 / self._game.delta_time
+                if kind.timer > kind.interval:
+                    kind.timer = 0.0
+                    self._queue.append(name)
+        while self._wave < len(self._waves) and self._waves[self._wave][0] <= self.tick:
+            tick, name, count = self._waves[self._wave]
+            self.request(name, count)
+            self._wave += 1
+        for x in range(min(self._max_per_tick, len(self._queue))):
+            self.spawn(self._queue.popleft())
+        self.tick += 1
+
+    def get_state(self):
+        """Director state, for save states
+
+        Returns:
+            dict -- tick, next wave, kind timers and queued kind names"""
+
+        return {"tick": self.tick,
+                "wave": self._wave,
+                "timers": {name: kind.timer for name, kind in self._kinds.items()},
+                "queue": list(self._queue)}
+
+    def set_state(self, state):
+        """Restore a get_state result, unknown kinds are ignored"""
+
+        self.tick = state["tick"]
+        self._wave = min(state["wave"], len(self._waves))
+        for name, timer in state["timers"].items():
+            if name in self._kinds:
+                self._kinds[name].timer = timer
+        self._queue = collections.deque(name for name in state["queue"] if name in self._kinds)
+
+    def stats(self):
+        """Director counters
+
+        Returns:
+            dict -- spawned, over_budget, no_space, queued and population of every kind"""
+
+        return {"spawned": self.spawned,
+                "over_budget": self.over_budget,
+                "no_space": self.no_space,
+                "queued": len(self._queue),
+                "population": {name: self._game.entities.count(kind.tag)
+                               for name, kind in self._kinds.items()}}
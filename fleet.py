@@ -0,0 +1,247 @@
+import numpy
+
+
+# cell offsets of a cell and its neighbours
+_NEIGHBOURS = numpy.array([(column, row) for column in (-1, 0, 1) for row in (-1, 0, 1)])
+
+
+def _thrust(speed, direction, max_speed, acceleration, active, sign):
+    """Ship.controls thrust with its speed clamp, applied to all ships at once.
+    A speed component only grows while it is below the max speed along direction.
+
+    Arguments:
+        speed {array: float} -- (N, 2) ship speeds, changed in place
+        direction {array: float} -- (N, 2) thrust unit vectors
+        max_speed {array: float} -- (N,) nominal max speeds
+        acceleration {array: float} -- (N,) accelerations divided by delta time
+        active {array: bool} -- (N,) ships thrusting
+        sign {int} -- 1 forward, -1 backward"""
+
+    limit = max_speed[:, None] * direction * sign
+    below = numpy.where(limit > 0, speed <= limit, speed >= limit)
+    speed += numpy.where(active[:, None] & below,
+                         acceleration[:, None] * direction * sign, 0)
+
+
+class Fleet:
+    """AI controller of non player ships.
+    Ships state is kept in numpy arrays and steering (seek the player, avoid ships and
+    obstacles, orbit a center, fire) is computed for all ships at once every simulation
+    step, then written back to the sprites for rendering and collisions.
+    Fleet ships are not updated by their group, the fleet moves them.
+
+    Arguments:
+        game {object} -- game instance
+        center {object} -- game object orbited when the player is away
+        obstacles {object} -- group of the sprites avoided by the ships
+        orbit_radius {float} -- orbit distance from center
+        aggro_radius {float} -- distance from which the player is chased
+        fire_range {float} -- max distance from the player to fire
+        avoid_radius {float} -- ships closer than this push each other away
+        trail_interval {int} -- steps between two trail particles of a ship, ships take
+                                turns so every step only some of them emit one"""
+
+    def __init__(self, game, center, obstacles, orbit_radius=700.0, aggro_radius=900.0,
+                 fire_range=700.0, avoid_radius=120.0, trail_interval=4):
+        self._game = game
+        self._center = center
+        self._obstacles = obstacles
+        self._orbit_radius = orbit_radius
+        self._aggro_radius = aggro_radius
+        self._fire_range = fire_range
+        self._avoid_radius = avoid_radius
+        self._trail_interval = trail_interval
+        self._ticks = 0
+        self.ships = game.entities.view("fleet")
+        self.clear()
+
+    def clear(self):
+        """Release every ship, they keep their fleet tag"""
+
+        self._sprites = []
+
+        # ship state, one row per ship
+        self._position = numpy.zeros((0, 2))
+        self._speed = numpy.zeros((0, 2))
+        self._angle = numpy.zeros(0)
+        self._bullet_timer = numpy.zeros(0)
+        # ship settings
+        self._acceleration = numpy.zeros(0)
+        self._h_acceleration = numpy.zeros(0)
+        self._max_speed = numpy.zeros(0)
+        self._spin = numpy.zeros(0)
+        self._fire_rate = numpy.zeros(0)
+
+    def __len__(self):
+        return len(self._sprites)
+
+    def add(self, *ships):
+        """Put ships {object} under fleet control"""
+
+        if not ships:
+            return
+        for ship in ships:
+            self._game.spawn(ship, "fleet")
+        self._sprites.extend(ships)
+        self._position = numpy.vstack([self._position, [ship._position for ship in ships]])
+        self._speed = numpy.vstack([self._speed, [ship._speed for ship in ships]])
+        for name, values in (("_angle", [ship._angle for ship in ships]),
+                             ("_bullet_timer", [ship._bullet_timer for ship in ships]),
+                             ("_acceleration", [ship._acceleration for ship in ships]),
+                             ("_h_acceleration", [ship._h_acceleration for ship in ships]),
+                             ("_max_speed", [ship._max_speed for ship in ships]),
+                             ("_spin", [ship._original_spin for ship in ships]),
+                             ("_fire_rate", [ship._fire_rate for ship in ships])):
+            setattr(self, name, numpy.append(getattr(self, name), values))
+
+    def _remove_dead(self):
+        alive = numpy.array([ship.alive() for ship in self._sprites], bool)
+        if alive.all():
+            return
+        self._sprites = [ship for ship in self._sprites if ship.alive()]
+        for name in ("_position", "_speed", "_angle", "_bullet_timer", "_acceleration",
+                     "_h_acceleration", "_max_speed", "_spin", "_fire_rate"):
+            setattr(self, name, getattr(self, name)[alive])
+
+    def _separation(self, others, radius):
+        """Sum of the pushes away from others closer than radius.
+        Others are binned in cells of radius side, only the pairs in neighbour cells
+        are compared.
+
+        Arguments:
+            others {array: float} -- (M, 2) positions to keep away from
+            radius {float} -- push distance
+
+        Returns:
+            array -- (N, 2) push of every ship"""
+
+        push = numpy.zeros_like(self._position)
+        if not len(others):
+            return push
+        # cell keys, the offset keeps columns and rows positive
+        other_cells = numpy.floor(others / radius).astype(numpy.int64) + 1
+        keys = (other_cells[:, 0] << 32) + other_cells[:, 1]
+        order = numpy.argsort(keys, kind="stable")
+        keys = keys[order]
+
+        # the 9 cells around every ship, looked up at once
+        cells = numpy.floor(self._position / radius).astype(numpy.int64) + 1
+        query = (cells[:, None, :] + _NEIGHBOURS).reshape(-1, 2)
+        query = (query[:, 0] << 32) + query[:, 1]
+        start = numpy.searchsorted(keys, query, "left")
+        counts = numpy.searchsorted(keys, query, "right") - start
+        total = counts.sum()
+        if not total:
+            return push
+
+        # expand the (ship, other) pairs
+        ships = numpy.repeat(numpy.arange(len(query)) // len(_NEIGHBOURS), counts)
+        firsts = numpy.repeat(start - numpy.cumsum(counts) + counts, counts)
+        pairs = order[firsts + numpy.arange(total)]
+        offset = self._position[ships] - others[pairs]
+        distance = (offset ** 2).sum(axis=1)
+        weight = numpy.where((distance < radius ** 2) & (distance > 0),
+                             radius / numpy.maximum(distance, 1), 0)
+        push[:, 0] = numpy.bincount(ships, offset[:, 0] * weight, len(push))
+        push[:, 1] = numpy.bincount(ships, offset[:, 1] * weight, len(push))
+        return push
+
+    def update(self, player):
+        """Steer, move and fire with every ship, one simulation step
+
+        Arguments:
+            player {object} -- ship chased by the fleet"""
+
+        self._remove_dead()
+        if not self._sprites:
+            return
+        game = self._game
+        delta_time = game.delta_time
+        position = self._position
+
+        # orbit the center: tangent direction plus a pull towards the orbit radius
+        to_center = numpy.asarray(self._center._position, float) - position
+        center_distance = numpy.maximum(numpy.hypot(to_center[:, 0], to_center[:, 1]), 1)
+        to_center /= center_distance[:, None]
+        desired = (numpy.column_stack((-to_center[:, 1], to_center[:, 0])) +
+                   to_center * ((center_distance - self._orbit_radius) / self._orbit_radius)[:, None])
+
+        # seek the player when close enough
+        to_player = numpy.asarray(player._position, float) - position
+        player_distance = numpy.maximum(numpy.hypot(to_player[:, 0], to_player[:, 1]), 1)
+        chasing = (player_distance < self._aggro_radius) & player.alive()
+        desired = numpy.where(chasing[:, None], to_player / player_distance[:, None], desired)
+
+        # avoid other ships, obstacles and map edges
+        obstacles = numpy.array([sprite._position for sprite in self._obstacles], float).reshape(-1, 2)
+        desired += self._separation(position, self._avoid_radius) * 0.02
+        desired += self._separation(obstacles, self._avoid_radius) * 0.02
+        bounds = game.bounds
+        desired[:, 0] += ((position[:, 0] < bounds.left + 150).astype(float) -
+                          (position[:, 0] > bounds.right - 150))
+        desired[:, 1] += ((position[:, 1] < bounds.top + 150).astype(float) -
+                          (position[:, 1] > bounds.bottom - 150))
+
+        # turn towards the desired direction at the ship spin
+        desired_angle = numpy.degrees(numpy.arctan2(-desired[:, 1], desired[:, 0]))
+        turn = (desired_angle - self._angle + 180) % 360 - 180
+        max_turn = self._spin / delta_time
+        self._angle += numpy.clip(turn, -max_turn, max_turn)
+        radians = numpy.radians(self._angle)
+        heading = numpy.column_stack((numpy.cos(radians), -numpy.sin(radians)))
+        side = numpy.column_stack((numpy.cos(radians + numpy.pi / 2), -numpy.sin(radians + numpy.pi / 2)))
+
+        # thrust when facing the desired direction, back off when too close to the player,
+        # strafe to correct the lateral error
+        norm = numpy.maximum(numpy.hypot(desired[:, 0], desired[:, 1]), 1e-9)[:, None]
+        lateral = ((desired / norm) * side).sum(axis=1)
+        forward = numpy.abs(turn) < 45
+        backward = chasing & (player_distance < 250)
+        _thrust(self._speed, heading, self._max_speed, self._acceleration / delta_time,
+                forward & ~backward, 1)
+        _thrust(self._speed, heading, self._max_speed, self._acceleration / delta_time,
+                backward, -1)
+        _thrust(self._speed, side, self._max_speed, self._h_acceleration / delta_time,
+                lateral > 0.3, 1)
+        _thrust(self._speed, side, self._max_speed, self._h_acceleration / delta_time,
+                lateral < -0.3, -1)
+
+        # move
+        previous = position.copy()
+        position += self._speed / delta_time
+
+        # engines trail of the ships in sight, whose turn it is
+        self._ticks += 1
+        turn_rows = (numpy.arange(len(position)) + self._ticks) % self._trail_interval == 0
+        in_sight = forward & ~backward & turn_rows & (
+            (numpy.abs(position[:, 0] - game.camera_x) < game.screen_size[0] / 2) &
+            (numpy.abs(position[:, 1] - game.camera_y) < game.screen_size[1] / 2))
+        if in_sight.any():
+            game.particles.emit(position[in_sight], int(in_sight.sum()),
+                                angle=self._angle[in_sight], image=game.white_shine)
+
+        # fire on the player when aligned with it
+        self._bullet_timer -= 1 / delta_time
+        aim = (numpy.degrees(numpy.arctan2(-to_player[:, 1], to_player[:, 0])) - self._angle + 180) % 360 - 180
+        firing = chasing & (player_distance < self._fire_range) & (numpy.abs(aim) < 8) & (self._bullet_timer <= 0)
+        self._bullet_timer[firing] = self._fire_rate[firing]
+
+        # write the state back to the sprites
+        changed = (self._angle != numpy.array([ship._angle for ship in self._sprites])).tolist()
+        for ship, old, new, speed, angle, timer, turned in zip(
+                self._sprites, previous.tolist(), position.tolist(), self._speed.tolist(),
+                self._angle.tolist(), self._bullet_timer.tolist(), changed):
+            ship._previous_position = old
+            ship._position[0], ship._position[1] = new
+            ship._speed = speed
+            if turned:
+                ship._angle = angle
+                ship._need_update = True
+            ship._bullet_timer = timer
+            ship.rect.center = (int(new[0]), int(new[1]))
+
+        for index in numpy.flatnonzero(firing):
+            ship = self._sprites[index]
+            bullet = game.bullet_pool.acquire(ship._bullet_image, ship._position, ship._angle,
+                                              ship._bullet_speed, ship, targets=game.allies)
+            game.spawn(bullet, "bullets", "all")
@@ -1,9 +1,31 @@
+import argparse
+import itertools
+import os
 import random
-import sys
+import time
+import numpy
 import pygame
-from PIL import Image
+import assets
+import director
+import entities
+import fleet
 import game_object
+import latency
+import lod
+import mask_cache
+import memstats
+import particles
 import player_object
+import pool
+import profiler
+import render
+import replay
+import rotation_cache
+import savestate
+import spatial_hash
+import starfield
+import targeting
+import text_cache
 
 
 class Game:
@@ -14,23 +36,59 @@ class Game:
         self.screen_size = screen_size
         self.debug_font = pygame.font.SysFont("monospace", 15)
         self.debug = debug
-        # self.delta_time = 0
 
         # Setting up the screen
         self.screen = pygame.display.set_mode(self.screen_size, pygame.DOUBLEBUF)
 
+        # Images, loaded once and shared
+        self.assets = assets.Assets()
+
+        # Renderer, every frame is fully redrawn unless dirty rect rendering is enabled
+        self.renderer = render.Renderer(self)
+
         # Game clock setting
         self.clock = pygame.time.Clock()
 
-        # Groups
-        self.ships = pygame.sprite.Group()
-        self.bullets = pygame.sprite.Group()
-        self.edge = pygame.sprite.Group()
-        self.allies = pygame.sprite.Group()
-        self.environment = pygame.sprite.Group()
-        self.starry_sky = pygame.sprite.Group()
-        self.targets = pygame.sprite.Group()
-        self.all = pygame.sprite.Group()
+        # Fixed simulation step, speeds are divided by delta_time (30 / step in ms)
+        self.sim_rate = 60
+        self.delta_time = 30 / (1000 / self.sim_rate)
+        self.max_steps = 5 # catch-up steps before a late frame is dropped
+        self.max_fps = 60 # rendering cap, the loop sleeps when ahead of it
+        self.paused = False
+        self.input = None # recorder or replay player, it sees the keys of every step
+        self.latency = None # input to display latency tracer
+        self.memstats = None # memory accounting, sampled every few steps
+
+        # Camera, locked on the scrolling object
+        self.camera_x = 0
+        self.camera_y = 0
+        self.camera_target = None
+
+        # Entities, every game object is registered once with its tags,
+        # the groups are views of the tags
+        self.entities = entities.EntityStore()
+        self.ships = self.entities.view("ships")
+        self.bullets = self.entities.view("bullets")
+        self.edge = self.entities.view("edge")
+        self.allies = self.entities.view("allies")
+        self.environment = self.entities.view("environment")
+        self.targets = self.entities.view("targets")
+        self.all = self.entities.view("all")
+        self.starry_sky = pygame.sprite.Group() # not a game object
+
+        # playable area, everything touching the map edges explodes
+        self.bounds = pygame.Rect(20, 20, self.map_size[0] - 20, self.map_size[1] - 20)
+
+        # collision broadphase, rebuilt every tick
+        self.target_grid = spatial_hash.SpatialHash()
+        # rect overlaps are confirmed by the pixels of the rotated images
+        self.precise_collisions = False
+        # missiles target acquisition, rebuilt every tick when needed
+        self.target_index = targeting.TargetIndex(self.targets)
+
+        # killed bullets and missiles are reused by the next shots
+        self.bullet_pool = pool.Pool(self, player_object.Bullet)
+        self.missile_pool = pool.Pool(self, player_object.Missile)
 
         # default shines, theoretic performance boost
         self.standard_shine = pygame.Surface([5, 2], pygame.SRCALPHA).convert_alpha()
@@ -39,31 +97,137 @@ class Game:
         self.white_shine.fill((255, 255, 255))
         self.lightred_shine = pygame.Surface([2, 2], pygame.SRCALPHA).convert_alpha()
         self.lightred_shine.fill((255, 150, 150))
+        self.particles = particles.ParticleSystem(self)
+
+        # far entities are updated every few steps, far particles expire at once
+        self.lod = lod.LevelOfDetail(self)
+
+        # Text rendering, HUD and debug labels are refreshed hud_rate times per second
+        self.text = text_cache.TextCache(self.debug_font)
+        self.hud_rate = 4
+        self.hud_refresh = True
+        self._hud_time = 0.0
+        self._hud = [] # HUD glyphs
+
+        # frame profiler, F3 toggles its overlay, F4 dumps it, F5 runs cProfile
+        self.profiler = profiler.Profiler()
+
+        # F6 saves the game state, F7 restores it
+        self.quicksave_path = "quicksave.sav"
+
+    def spawn(self, sprite, *tags):
+        """Register a game object in the entity store.
+
+        Arguments:
+            sprite {object} -- game object
+            tags {str} -- tags of the object, the name of the group views it appears in
+
+        Returns:
+            tuple -- entity handle, see EntityStore.get"""
+
+        return self.entities.spawn(sprite, *tags)
+
+    def colliding(self, sprite, candidates):
+        """Candidates of the rect broadphase which touch sprite: all of them, or only those
+        whose pixels overlap sprite ones in precise collision mode
+
+        Arguments:
+            sprite {object} -- game object
+            candidates {list: object} -- game objects whose rect overlaps sprite rect
+
+        Returns:
+            list -- colliding game objects"""
+
+        if not self.precise_collisions or not candidates:
+            return candidates
+        return [other for other in candidates if mask_cache.cache.overlap(sprite, other)]
+
+    def handle_event(self, event):
+        """Profiler and quick save hotkeys
+
+        Arguments:
+            event {object} -- pygame event"""
+
+        if self.latency is not None and event.type in (pygame.KEYDOWN, pygame.KEYUP):
+            self.latency.seen(event.key, event.type == pygame.KEYDOWN)
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == pygame.K_F3:
+            self.profiler.overlay = not self.profiler.overlay
+            self.profiler.enabled = self.profiler.overlay
+        elif event.key == pygame.K_F4 and self.profiler.frames:
+            print("Profile saved to %s.csv/json" %
+                  self.profiler.dump(time.strftime("profile_%Y%m%d_%H%M%S")))
+        elif event.key == pygame.K_F5 and not self.profiler.capturing:
+            path = time.strftime("profile_%Y%m%d_%H%M%S.prof")
+            self.profiler.start_capture(300, path)
+            print("cProfile capture of 300 frames to " + path)
+        elif event.key == pygame.K_F6:
+            savestate.save(self, self.quicksave_path)
+            print("Game saved to " + self.quicksave_path)
+        elif event.key == pygame.K_F7 and os.path.exists(self.quicksave_path):
+            savestate.load(self, self.quicksave_path)
+
+    def update_camera(self, alpha=1.0):
+        """Lock the camera on the interpolated position of the scrolling object
+
+        Arguments:
+            alpha {float} -- interpolation between the last two simulation steps"""
+
+        if self.camera_target is not None:
+            position = self.camera_target.interpolated_position(alpha)
+            self.camera_x = int(position[0])
+            self.camera_y = int(position[1])
+
+    def draw_group(self, group, alpha=1.0):
+        """Draw every sprite of group {object}"""
+
+        self.profiler.draw_group(group, alpha)
+
+    def enforce_bounds(self):
+        """Explode every sprite which touches the map edges.
+        All rects are checked against the playable area at once."""
+
+        sprites = [sprite for sprite in self.all.sprites() if sprite not in self.edge]
+        if not sprites:
+            return
+        rects = numpy.fromiter(itertools.chain.from_iterable(sprite.rect for sprite in sprites),
+                               numpy.int32, len(sprites) * 4).reshape(-1, 4)
+        outside = ((rects[:, 0] < self.bounds.left) |
+                   (rects[:, 1] < self.bounds.top) |
+                   (rects[:, 0] + rects[:, 2] > self.bounds.right) |
+                   (rects[:, 1] + rects[:, 3] > self.bounds.bottom))
+        for index in numpy.flatnonzero(outside):
+            sprites[index].explode()
 
 
 
 class TestGame(Game):
-    """Test game with some sprites and basic settings"""
+    """Test game with some sprites and basic settings
 
-    def __init__(self, map_size, screen_size, debug):
+    Arguments:
+        map_size {tuple: int} -- map size
+        screen_size {tuple: int} -- screen size
+        debug {bool} -- debug mode
+        ai_ships {int} -- number of enemy ships driven by the fleet AI"""
+
+    def __init__(self, map_size, screen_size, debug, ai_ships=0):
         super().__init__(map_size, screen_size, debug)
 
-        self.asteroids = pygame.sprite.Group()
+        self.asteroids = self.entities.view("asteroids")
+        self.asteroid_grid = spatial_hash.SpatialHash()
 
         # Finalize screen caption
         pygame.display.set_caption("Shooter")
 
         # User
-        self.user = player_object.Ship(self, pygame.image.load('Images/ship.png').convert_alpha(), 
+        self.user = player_object.Ship(self, self.assets.load("ship.png"), 
                                        [self.map_size[0] / 2, self.map_size[1] / 2 + 100],
                                        0.7, 0.4, 10, 10.0, 12.0, 8, need_max_rect=False,
                                        camera_mode='scrolling', controlled=True)
         self.camera_x = 100
         self.camera_y = 200
-        self.ships.add(self.user)
-        # self.targets.add(self.user)
-        self.allies.add(self.user)
-        self.all.add(self.user)
+        self.spawn(self.user, "ships", "allies", "all")
 
         # Edge objects [[position], [dimension]]
         boundaries = [[[0, 0], [map_size[0], 20]],
@@ -72,110 +236,372 @@ class TestGame(Game):
                       [[map_size[0], 0], [20, map_size[1] + 20]]]
         for obj in boundaries:
             item = game_object.Edge(self, obj[0], obj[1], (255, 0, 0))
-            self.edge.add(item)
-            self.environment.add(item)
-            self.all.add(item)
-
-        # Starry sky, randomly generated
-        img = Image.new('RGB', map_size)
-        pixel_map = img.load()
-        for x in range(1000):
-            pixel_map[random.randint(0, self.map_size[0] - 1),
-                      random.randint(0, self.map_size[1] - 1)] = (255, 255, 255, 0)
-        stars = game_object.Background(self, pygame.image.frombuffer(img.tobytes("raw", "RGB"), map_size, "RGB").convert())
-        self.starry_sky.add(stars)
-        img.close()
-        
+            self.spawn(item, "edge", "environment", "all")
+
+        # Starry sky, tiles are generated when in sight
+        self.starry_sky.add(starfield.Starfield(self, random.getrandbits(32)))
+
         # Base
-        self.base = game_object.Surface(self, pygame.image.load("Images/base.png").convert_alpha(),
+        self.base = game_object.Surface(self, self.assets.load("base.png"),
                                         [self.map_size[0] / 2, self.map_size[1] / 2],
                                         False, 0, spin=0.5, life=200)
-        self.environment.add(self.base)
-        self.allies.add(self.base)
+        self.spawn(self.base, "environment", "allies")
+
+        # Enemy fleet
+        self.fleet = fleet.Fleet(self, self.base, self.asteroids)
+
+        # Spawn director: asteroids trickle in away from the user and the base, up to
+        # their budget, enemy ships come with scripted waves
+        self.director = director.SpawnDirector(self)
+        self.director.register("asteroid", self._spawn_asteroid, "asteroids", budget=80,
+                               exclusions=(("user", 450), ("base", 800)), interval=60)
+        self.director.register("ai_ship", self.add_ai_ship, "fleet", budget=1000,
+                               exclusions=(("user", 600), ("base", 400)))
 
          # Asteroids
-        self.asteroid_image1 = pygame.image.load("Images/asteroid.png").convert_alpha()
+        self.asteroid_image1 = self.assets.load("asteroid.png")
         for x in range(20):
-            position = [random.randint(1, self.map_size[0]),
-                        random.randint(1, self.map_size[1])]
-            while self.base.distance_from(position) < 700:
-                position = [random.randint(1, self.map_size[0]),
-                            random.randint(1, self.map_size[1])]
-            test = game_object.Surface(self, self.asteroid_image1,
+            position = self.director.sample((("base", 700),))
+            if position is not None:
+                self.add_asteroid(position, [random.uniform(-4, 4), random.uniform(-4, 4)])
+
+        for x in range(ai_ships):
+            self.add_ai_ship()
+
+    def add_asteroid(self, position, speed):
+        """Spawn an asteroid
+
+        Arguments:
+            position {array: float} -- [x, y] spawn position
+            speed {array: float} -- [x, y] speed"""
+
+        asteroid = game_object.Surface(self, self.asteroid_image1,
                                        position, False, 8,
                                        spin=random.uniform(-2, 2),
-                                       speed=[random.uniform(-4, 4), random.uniform(-4, 4)], life=5)
-            self.environment.add(test)
-            self.asteroids.add(test)
-            self.targets.add(test)
-            self.all.add(test)
+                                       speed=speed, life=5)
+        self.spawn(asteroid, "environment", "asteroids", "targets", "all")
+        return asteroid
+
+    def _spawn_asteroid(self, position):
+        return self.add_asteroid(position, [random.uniform(-3, 3), random.uniform(-3, 3)])
+
+    def add_ai_ship(self, position=None):
+        """Spawn an enemy ship driven by the fleet AI
+
+        Arguments:
+            position {array: float} -- [x, y] spawn position, random on the fleet orbit if None"""
+
+        if position is None:
+            angle = random.uniform(0, 2 * numpy.pi)
+            distance = random.uniform(500, 900)
+            position = [self.base._position[0] + distance * numpy.cos(angle),
+                        self.base._position[1] + distance * numpy.sin(angle)]
+        ship = player_object.Ship(self, self.assets.load("ship.png"), position,
+                                  0.5, 0.3, 6, 8.0, 12.0, 30)
+        ship._life = 10
+        self.spawn(ship, "targets", "all")
+        self.fleet.add(ship)
+        return ship
 
     def mainloop(self):
-        """Main game loop
+        """Main game loop.
+        Simulation runs at fixed steps of 1 / sim_rate seconds, rendering interpolates the
+        last two steps and may run slower than the simulation without slowing it down.
         """
         done = False
-        counter = 0
+        step_time = 1 / self.sim_rate
+        accumulator = 0.0
+        previous = time.perf_counter()
 
         # check for exit
         while not done:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    done = True
-
-            # delta time, game is frame rate indipendent
-            self.delta_time = 30 / self.clock.tick_busy_loop(60)
-
-            # asteroids spawn
-            counter += 1 / self.delta_time
-            if counter / 60 > 1: # TODO optimize position
-                counter = 0
-                position = [random.randint(1, self.map_size[0]),
-                            random.randint(1, self.map_size[1])]
-                while self.user.distance_from(position) < 450 or self.base.distance_from(position) < 800:
-                    position = [random.randint(1, self.map_size[0]),
-                                random.randint(1, self.map_size[1])]
-
-                test = game_object.Surface(self, self.asteroid_image1,
-                                           position,
-                                           False, 8, spin=random.uniform(-2, 2),
-                                           speed=[random.uniform(-3, 3), random.uniform(-3, 3)], life=5)
-                self.environment.add(test)
-                self.asteroids.add(test)
-                self.targets.add(test)
-                self.all.add(test)
+            if self.input is not None and self.input.finished:
+                break
+            self.profiler.begin_frame()
+            with self.profiler.scope("events"):
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        done = True
+                    self.handle_event(event)
+
+            now = time.perf_counter()
+            accumulator += now - previous
+            previous = now
 
             # keys events
             keys = pygame.key.get_pressed()
+            if self.latency is not None:
+                self.latency.sample(keys)
+
+            # catch up with real time, the backlog is dropped when too late
+            steps = 0
+            while accumulator >= step_time and steps < self.max_steps:
+                self.step(self.input.keys(keys) if self.input is not None else keys)
+                if self.memstats is not None:
+                    self.memstats.tick()
+                accumulator -= step_time
+                steps += 1
+            if steps == self.max_steps:
+                accumulator = min(accumulator, step_time)
+
+            self.render(accumulator / step_time)
+            self.profiler.end_frame()
+
+            # sleep, not spin, until next frame
+            self.clock.tick(self.max_fps)
+
+        self.profiler.stop_capture()
+        pygame.quit()
+
+    def tick(self, keys):
+        """One simulation step followed by rendering, used by scripted runs.
+
+        Arguments:
+            keys {tuple} -- pressed keys, as returned by pygame.key.get_pressed"""
+
+        if self.latency is not None:
+            self.latency.sample(keys)
+        self.step(keys)
+        self.render()
+
+    def simulate(self, ticks, keys=replay.MaskKeys(0)):
+        """Run ticks simulation steps as fast as possible, nothing is drawn.
+        Used headless for soak tests, balancing runs and replays.
+
+        Arguments:
+            ticks {int} -- number of steps
+            keys {object} -- pressed keys of every step, game.input keys are used if set
+
+        Returns:
+            dict -- ticks, seconds, ticks_per_second and realtime, the speed over real time"""
+
+        start = time.perf_counter()
+        for tick in range(ticks):
+            self.step(self.input.keys(keys) if self.input is not None else keys)
+            if self.memstats is not None:
+                self.memstats.tick()
+        seconds = time.perf_counter() - start
+        ticks_per_second = ticks / seconds if seconds else 0.0
+        return {"ticks": ticks,
+                "seconds": seconds,
+                "ticks_per_second": ticks_per_second,
+                "realtime": ticks_per_second / self.sim_rate}
+
+    def step(self, keys):
+        """Advance the simulation by one fixed step: spawn, collisions and sprites update.
+
+        Arguments:
+            keys {tuple} -- pressed keys, as returned by pygame.key.get_pressed"""
+
+        # asteroids and waves spawn
+        with self.profiler.scope("spawn"):
+            self.director.update()
+
+        with self.profiler.scope("collisions"):
+            # collision grids
+            self.target_grid.rebuild(self.targets)
+            self.asteroid_grid.rebuild(self.asteroids)
+            self.target_index.invalidate()
 
             # asteroids collision
-            for ally, asteroids in pygame.sprite.groupcollide(self.allies, self.asteroids, False, False).items():
+            collisions = [(ally, self.colliding(ally, self.asteroid_grid.query_rect(ally.rect)))
+                          for ally in self.allies]
+            for ally, asteroids in collisions:
                 for obj in asteroids:
                     ally.hit(obj._damage)
                     obj.explode(color=(255, 0, 0))
 
-            # pause the game
-            if not keys[pygame.K_a]:
-                # Refresh screen and update sprites
-                self.screen.fill((0, 0, 0))
-                self.starry_sky.update()
-                self.bullets.update()
-                self.ships.update(keys)
-                self.environment.update()
-                display_label = self.debug_font.render(" Sprites in game:" +
-                                                        str(len(self.all.sprites())) +
-                                                        ", fps: " + str(self.clock.get_fps()),
-                                                        1, (255, 255, 0))
-                GAME.screen.blit(display_label, (0, 0))
-                pygame.display.update()
+        # pause the game
+        self.paused = keys[pygame.K_a]
+        if self.paused:
+            return
 
-        pygame.quit()
+        # update sprites, far ones at a lower rate
+        with self.profiler.scope("lod"):
+            self.lod.update()
+        with self.profiler.scope("bullets"):
+            bullets = self.lod.due(self.bullets)
+            player_object.retarget(self, bullets)
+            self.profiler.update_group(bullets)
+        with self.profiler.scope("ships"):
+            self.profiler.update_group(self.ships, keys)
+        with self.profiler.scope("fleet"):
+            self.fleet.update(self.user)
+        with self.profiler.scope("environment"):
+            self.profiler.update_group(self.lod.due(self.environment))
+        with self.profiler.scope("bounds"):
+            self.enforce_bounds()
+        with self.profiler.scope("particles"):
+            self.particles.update()
+
+    def render(self, alpha=1.0):
+        """Draw the game between the last two simulation steps.
+
+        Arguments:
+            alpha {float} -- 0 is the previous step, 1 the current one"""
+
+        if self.paused:
+            alpha = 1.0
+        self.update_camera(alpha)
+
+        now = time.perf_counter()
+        self.hud_refresh = now - self._hud_time >= 1 / self.hud_rate
+        if self.hud_refresh:
+            self._hud_time = now
+
+        # Refresh screen
+        with self.profiler.scope("background"):
+            self.renderer.begin()
+            self.draw_group(self.starry_sky, alpha)
+        with self.profiler.scope("draw"):
+            members = self.entities.members
+            self.renderer.draw_sprites(list(itertools.chain(members("bullets"), members("ships"),
+                                                            members("fleet"), members("environment"))),
+                                       alpha)
+        with self.profiler.scope("particles_draw"):
+            self.particles.draw(alpha)
+        with self.profiler.scope("hud"):
+            if self.hud_refresh:
+                self._hud = self.text.glyphs(" Sprites in game: %d, particles: %d, fps: %.1f" %
+                                             (len(self.all), len(self.particles),
+                                              self.clock.get_fps()), (0, 0))
+                if self.debug:
+                    stats = rotation_cache.cache.stats()
+                    self._hud += self.text.glyphs(" Rotation cache: %d hits, %d misses, %d entries" %
+                                                  (stats["hits"], stats["misses"], stats["entries"]),
+                                                  (0, 15))
+                    bullets, missiles = self.bullet_pool.stats(), self.missile_pool.stats()
+                    self._hud += self.text.glyphs(" Pools: bullets %d used %d free %d misses,"
+                                                  " missiles %d used %d free %d misses" %
+                                                  (bullets["in_use"], bullets["free"], bullets["misses"],
+                                                   missiles["in_use"], missiles["free"], missiles["misses"]),
+                                                  (0, 30))
+                    spawns = self.director.stats()
+                    self._hud += self.text.glyphs(" Spawns: %d spawned, %d over budget, %d queued,"
+                                                  " asteroids %d, fleet %d" %
+                                                  (spawns["spawned"], spawns["over_budget"],
+                                                   spawns["queued"], spawns["population"]["asteroid"],
+                                                   spawns["population"]["ai_ship"]), (0, 45))
+                    if self.precise_collisions:
+                        masks = mask_cache.cache.stats()
+                        self._hud += self.text.glyphs(" Masks: %d entries, %d tests, %d rejected,"
+                                                      " hit rate %.2f" %
+                                                      (masks["entries"], masks["tests"],
+                                                       masks["rejected"], masks["hit_rate"]), (0, 60))
+            self.renderer.blits(self._hud)
+        if self.profiler.overlay:
+            self.renderer.after(lambda screen: self.profiler.draw_overlay(screen, self.debug_font,
+                                                                          budget=1 / self.max_fps))
+        with self.profiler.scope("display"):
+            display_start = time.perf_counter()
+            self.renderer.present()
+        if self.latency is not None:
+            self.latency.presented(display_start)
 
 if __name__ == "__main__":
-    # Initialize pygame
+    parser = argparse.ArgumentParser(description="Shooter")
+    parser.add_argument("-d", dest="debug", action="store_true", help="debug mode")
+    parser.add_argument("--dirty", action="store_true",
+                        help="dirty rect rendering, only changed screen areas are redrawn")
+    parser.add_argument("--precise", action="store_true",
+                        help="pixel accurate collisions, rect overlaps are confirmed by the sprites masks")
+    parser.add_argument("-p", dest="profile", action="store_true",
+                        help="profile every frame, show the overlay and dump the last frames on exit")
+    parser.add_argument("--cprofile", type=int, metavar="FRAMES",
+                        help="run cProfile for the first FRAMES frames, stats go to profile.prof")
+    parser.add_argument("--ai", type=int, default=0, metavar="SHIPS",
+                        help="number of enemy ships driven by the fleet AI")
+    parser.add_argument("--headless", type=int, metavar="TICKS",
+                        help="simulate TICKS steps without window nor rendering and report ticks/s")
+    parser.add_argument("--seed", type=int, help="random seed, random if missing")
+    parser.add_argument("--record", metavar="FILE", help="record keys and state checksums to FILE")
+    parser.add_argument("--replay", metavar="FILE", help="replay a recording")
+    parser.add_argument("--fast", action="store_true",
+                        help="replay as fast as possible with rendering off")
+    parser.add_argument("--wave", nargs=3, action="append", default=[],
+                        metavar=("TICK", "KIND", "COUNT"),
+                        help="spawn COUNT objects of KIND (asteroid, ai_ship) at TICK, repeatable")
+    parser.add_argument("--latency", metavar="FILE",
+                        help="trace input to display latency, one CSV line per input in FILE")
+    parser.add_argument("--memstats", metavar="FILE",
+                        help="sample memory per object class, dumped as JSON to FILE on exit")
+    parser.add_argument("--memstats-interval", type=int, default=3600, metavar="TICKS",
+                        help="steps between two memory samples")
+    parser.add_argument("--load", metavar="FILE", help="start from a saved game state")
+    parser.add_argument("--save", metavar="FILE", help="save the game state to FILE on exit")
+    args = parser.parse_args()
+
+    # Initialize pygame, headless runs and fast replays draw nothing
+    if args.headless or (args.replay and args.fast):
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
     pygame.init()
-    if len(sys.argv) > 1 and sys.argv[1] == '-d':
-        debug = True
+    map_size, screen_size, ai_ships = (2500, 2500), (1300, 800), args.ai
+    seed = args.seed if args.seed is not None else random.getrandbits(32)
+    if args.replay:
+        if args.precise or args.wave:
+            parser.error("--precise and --wave are read from the recording")
+        player = replay.Player(args.replay)
+        map_size, screen_size, ai_ships, seed = (player.map_size, player.screen_size,
+                                                 player.ai_ships, player.seed)
+    random.seed(seed)
+    GAME = TestGame(map_size, screen_size, args.debug, ai_ships) # mapsize, screensize, debug_enable
+    for tick, kind, count in args.wave:
+        try:
+            GAME.director.schedule(int(tick), kind, int(count))
+        except ValueError as error:
+            parser.error("--wave %s %s %s: %s" % (tick, kind, count, error))
+    GAME.precise_collisions = args.precise
+    if args.latency:
+        GAME.latency = latency.LatencyTracer(args.latency)
+    if args.memstats:
+        GAME.memstats = memstats.MemoryStats(GAME, args.memstats_interval)
+    if args.dirty:
+        GAME.renderer = render.DirtyRectRenderer(GAME)
+    if args.profile:
+        GAME.profiler.enabled = GAME.profiler.overlay = True
+    if args.cprofile:
+        GAME.profiler.start_capture(args.cprofile, "profile.prof")
+    if args.record:
+        GAME.input = replay.Recorder(args.record, GAME, seed, ai_ships)
+    if args.replay:
+        if player.sim_rate != GAME.sim_rate:
+            parser.error("recorded at %d steps per second, the game runs %d" %
+                         (player.sim_rate, GAME.sim_rate))
+        player.attach(GAME)
+        GAME.input = player
+    if args.load:
+        savestate.load(GAME, args.load)
+
+    if args.replay and args.fast:
+        result = player.run()
+        print("Replayed %(ticks)d ticks in %(seconds).2f s, %(ticks_per_second).0f ticks/s" % result)
+    elif args.headless:
+        result = GAME.simulate(args.headless)
+        print("Simulated %(ticks)d ticks in %(seconds).2f s, %(ticks_per_second).0f ticks/s, "
+              "%(realtime).1fx real time" % result)
+        print("Sprites: %d, particles: %d" % (len(GAME.all), len(GAME.particles)))
     else:
-        debug = False
-    GAME = TestGame((2500, 2500), (1300, 800), debug) # mapsize, screensize, debug_enable
-    GAME.mainloop()
+        GAME.mainloop()
+    if args.save:
+        savestate.save(GAME, args.save)
+    if args.record:
+        GAME.input.close()
+    if args.replay:
+        print("Checksum mismatches: %s" % (player.mismatches or "none"))
+    if args.profile:
+        print("Profile saved to %s.csv/json" % GAME.profiler.dump())
+    if args.latency:
+        GAME.latency.close()
+        for kind, report in GAME.latency.report().items():
+            print("%-6s latency: " % kind +
+                  "%(count)d inputs, p50 %(p50).1f ms, p90 %(p90).1f ms, p99 %(p99).1f ms, "
+                  "max %(max).1f ms" % report)
+    if args.memstats:
+        sample = GAME.memstats.sample()
+        GAME.memstats.close()
+        GAME.memstats.dump(args.memstats)
+        for name, entry in sorted(sample["classes"].items()):
+            print("%-8s memory: %d live, %d killed but referenced, %.1f KB, %.1f KB of pixels" %
+                  (name, entry["live"], entry["killed"], entry["bytes"] / 1024,
+                   entry["surface_bytes"] / 1024))
+        print("Memory samples saved to %s" % args.memstats)
@@ -1,6 +1,6 @@
 import math
-import random
 import pygame
+import rotation_cache
 
 
 class Game_Object(pygame.sprite.Sprite):
@@ -16,9 +16,28 @@ class Game_Object(pygame.sprite.Sprite):
                                scrolling = locked camera on player ship
     """
 
+    _pool = None # pool the object goes back to when killed
+    _slot = None # entity store slot, None when not registered
+    _lod = False # far objects may be updated every few steps, see LevelOfDetail
+    _layer = 0 # render order, lower layers are drawn first, see Renderer.draw_sprites
+
     def __init__(self, game, position, image, debuggable, need_max_rect=False, camera_mode="normal"):
         super().__init__()
         self._game = game
+        self._debuggable = debuggable
+        self._camera_mode = camera_mode
+        self.reset_object(position, image, need_max_rect)
+        if camera_mode == "scrolling":
+            self._game.camera_target = self
+
+    def reset_object(self, position, image, need_max_rect=False):
+        """Set the initial state of the object, also used to reuse pooled objects.
+
+        Arguments:
+            position {float: array} -- [x, y] spawn position
+            image {object} -- pygame surface
+            need_max_rect {bool} -- same as the constructor"""
+
         self._image = image
         if image:
             self._size = self._image.get_size()
@@ -26,7 +45,6 @@ class Game_Object(pygame.sprite.Sprite):
         self._speed = [0, 0] # [x, y]
         self._angle = 0
         self._spin = 0
-        self._debuggable = debuggable
         self.image_handler() # initialize image attributes
         if need_max_rect:
             max_rect = self.get_max_rect()
@@ -37,10 +55,12 @@ class Game_Object(pygame.sprite.Sprite):
         else:
             self.rect = self._image.get_rect(center=position)
         self._position = [position[0], position[1]]
+        self._previous_position = (position[0], position[1]) # required by interpolation
         self._origin = self._position
         self._label_position = self._position # required in debug
-        self._camera_mode = camera_mode
+        self._label_lines = None # rendered debug label
         self._need_update = True
+        self._lag = 0 # steps skipped by the level of detail, integrated by the next update
 
     def __str__(self):
         return """
@@ -57,26 +77,28 @@ class Game_Object(pygame.sprite.Sprite):
                            self._speed[0], self._speed[1],
                            self._spin, self._angle, self._camera_mode, self.distance_from(self._game.base._position))
 
+    def alive(self):
+        """Overriden pygame.sprite.Sprite method, True when registered in the entity store
+        or in a pygame group"""
+
+        return self._slot is not None or super().alive()
+
+    def kill(self):
+        """Overriden pygame.sprite.Sprite method, the object leaves the entity store and
+        pooled objects go back to their pool"""
+
+        alive = self.alive()
+        self._game.entities.remove(self)
+        super().kill()
+        if alive and self._pool is not None:
+            self._pool.release(self)
+
     def explode(self, color=None):
         """kill the sprite and make fireworks"""
 
         self.kill()
-        if color: # reduntant code due to performance issue TODO
-            for x in range(50):
-                shine = Shine(self._game, [self.rect.centerx, self.rect.centery],
-                              random.randint(1, 360), spin=random.uniform(-2, 2),
-                              color=color)
-                self._game.environment.add(shine)
-                self._game.all.add(shine)
-        else:
-            for x in range(50):
-                shine = Shine(self._game, [self.rect.centerx, self.rect.centery],
-                              random.randint(1, 360), spin=random.uniform(-2, 2),
-                              color=(random.randint(1, 255),
-                                     random.randint(1, 255),
-                                     random.randint(1, 255)))
-                self._game.environment.add(shine)
-                self._game.all.add(shine)
+        self._game.particles.emit([self.rect.centerx, self.rect.centery], 50,
+                                  image=self._game.particles.color(color) if color else None)
 
     def hit(self, damage):
         """hit the object, life drops according to damage {int}"""
@@ -127,25 +149,26 @@ class Game_Object(pygame.sprite.Sprite):
 
     def get_max_rect(self):
         """side lenght of the square which contains the image independently of the its angle.
+        The rotated image comes from the last image_handler call.
         
         Returns:
             float"""
 
-        self.image_handler()
         rect = self.rotated_image.get_rect()
         return (rect.width**2 + rect.height**2)**0.5
 
     def display_label(self):
-        """Debug mode.Display object __str__ as a label in game"""
+        """Debug mode.Display object __str__ as a label in game.
+        Text is refreshed at the game HUD rate, unchanged lines come from the text cache"""
 
-        values = self.__str__()
-        values = values.split("\n")
+        if self._label_lines is None or self._game.hud_refresh:
+            self._label_lines = [self._game.text.render(string)
+                                 for string in self.__str__().split("\n")]
         offset = -15
 
-        for string in values:
+        for display_label in self._label_lines:
             offset += 15
-            display_label = self._game.debug_font.render(string, 1, (255, 255, 0))
-            self._game.screen.blit(display_label, (self._label_position[0], 
+            self._game.renderer.blit(display_label, (self._label_position[0], 
                                                    self._label_position[1] + offset))
 
     def display_rect(self):
@@ -153,67 +176,40 @@ class Game_Object(pygame.sprite.Sprite):
 
         new_rect = self.rect.copy()
         new_rect.topleft = self._label_position
-        pygame.draw.rect(self._game.screen, (255, 0, 0),
-                         new_rect, 1)
+        self._game.renderer.draw_rect((255, 0, 0), new_rect, 1)
 
     def image_handler(self):
-        """Redefine rotated image and center"""
+        """Redefine rotated image and center, rotations are shared through the rotation cache"""
 
-        box = [pygame.math.Vector2(p) for p in [(0, 0), (self._size[0], 0),
-               (self._size[0], -self._size[1]), (0, -self._size[1])]]
-        box_rotate = [p.rotate(self._angle) for p in box]
-        self.min_box = (min(box_rotate, key=lambda p: p[0])[0],
-                        min(box_rotate, key=lambda p: p[1])[1])
-        self.max_box = (max(box_rotate, key=lambda p: p[0])[0],
-                        max(box_rotate, key=lambda p: p[1])[1])
-
-        # calculate the translation of the pivot 
-        pivot = pygame.math.Vector2(self._size[0] / 2, -self._size[1] / 2)
-        pivot_rotate = pivot.rotate(self._angle)
-        self.pivot_move = pivot_rotate - pivot
-
-        self.rotated_image = pygame.transform.rotate(self._image, self._angle)
+        (self.rotated_image, self.min_box,
+         self.max_box, self.pivot_move) = rotation_cache.cache.rotate(self._image, self._angle)
+        # top left corner of the rotated image from the object position
+        self._draw_offset = (-self._size[0] / 2 + self.min_box[0] - self.pivot_move[0],
+                             -self._size[1] / 2 - self.max_box[1] + self.pivot_move[1])
 
     def update(self):
-        """Updates sprite position and image"""
+        """Updates sprite position, one simulation step plus the skipped ones"""
 
-        # redefine position and rotate sprite image 
-        self._position[0] += self._speed[0] / self._game.delta_time
-        self._position[1] += self._speed[1] / self._game.delta_time
+        steps = self._lag + 1
+        self._lag = 0
+        self._previous_position = (self._position[0], self._position[1])
+        self._position[0] += self._speed[0] * steps / self._game.delta_time
+        self._position[1] += self._speed[1] * steps / self._game.delta_time
         self.rect.centerx = int(self._position[0])
         self.rect.centery = int(self._position[1])
 
-        if self._need_update and self.is_in_screen():
-            self.image_handler()
-            self._need_update = False
-
-        if self._camera_mode == 'scrolling':
-            # user ship handling with camera position
-            self._game.camera_x = int(self._position[0])
-            self._game.camera_y = int(self._position[1])
-            w, h = self.rotated_image.get_size()
-            x = (self._game.screen_size[0] / 2.0) - w / 2
-            y = (self._game.screen_size[1] / 2.0) - h / 2
-            self._label_position = ((self._game.screen_size[0] / 2.0) - self.rect.width / 2,
-                                    (self._game.screen_size[1] / 2.0) - self.rect.height / 2)
-            # blitting
-            self._game.screen.blit(self.rotated_image, (x, y))
-
-        elif self._camera_mode == "normal" and self.is_in_screen():
-            # calculate the center origin of the rotated image
-            self._origin = (self._position[0] - self._size[0] / 2 + self.min_box[0] - self.pivot_move[0],
-                            self._position[1] - self._size[1] / 2 - self.max_box[1] + self.pivot_move[1])
-            # calculate the debug info position
-            self._label_position = ((self._game.screen_size[0] / 2) - (self._game.camera_x - self.rect.x),
-                                    (self._game.screen_size[1] / 2) - (self._game.camera_y - self.rect.y))
-            # blitting
-            self._game.screen.blit(self.rotated_image, 
-                                   ((self._game.screen_size[0] / 2) - ((self._game.camera_x - self._origin[0])),
-                                    (self._game.screen_size[1] / 2) - ((self._game.camera_y - self._origin[1]))))
-
-        if self._game.debug and self.is_in_screen() and self._debuggable:
-            self.display_label()
-            self.display_rect()
+    def interpolated_position(self, alpha):
+        """Position between the previous and the current simulation step
+
+        Arguments:
+            alpha {float} -- 0 is the previous step, 1 the current one
+
+        Returns:
+            tuple: float -- [x, y] position"""
+
+        previous = self._previous_position
+        return (previous[0] + (self._position[0] - previous[0]) * alpha,
+                previous[1] + (self._position[1] - previous[1]) * alpha)
 
 
 class Background(pygame.sprite.Sprite):
@@ -229,9 +225,9 @@ class Background(pygame.sprite.Sprite):
         self._image = image
         self.rect = self._image.get_rect(topleft=(0, 0))
     
-    def update(self):
+    def draw(self, alpha=1.0):
         # blitting
-        self._game.screen.blit(self._image, 
+        self._game.renderer.blit(self._image, 
                                ((self._game.screen_size[0] / 2) - ((self._game.camera_x)),
                                 (self._game.screen_size[1] / 2) - ((self._game.camera_y))))
 
@@ -250,6 +246,9 @@ class Surface(Game_Object):
         speed {array: float} -- default is [0, 0]
         life {float} -- default is immortal object"""
 
+    _lod = True
+    _layer = 2
+
     def __init__(self, game, image, position, need_max_rect=False, damage=5,
                  debuggable=True, camera_mode="normal", spin=0, speed=[0, 0],
                  life="immortal"):
@@ -262,12 +261,15 @@ class Surface(Game_Object):
         self._damage = damage
 
     def update(self):
-        self.spin(self._spin / self._game.delta_time)
+        self.spin(self._spin * (self._lag + 1) / self._game.delta_time)
         Game_Object.update(self)
 
 
 class Edge(Surface):
-    """Map Edge surface, child of Surface"""
+    """Map Edge surface, child of Surface.
+    Edges are only drawn, sprites touching them are exploded by Game.enforce_bounds"""
+
+    _lod = False
 
     def __init__(self, game, position, dimension, color):
         super().__init__(game, pygame.Surface(dimension, pygame.SRCALPHA).convert_alpha(),
@@ -277,47 +279,11 @@ class Edge(Surface):
         self.rect = self._image.get_rect(topleft=position)
         self._need_update = False
 
-    def update(self):
-        self._label_position = ((self._game.screen_size[0] / 2) - ((self._game.camera_x - self.rect.x)),
-                                (self._game.screen_size[1] / 2) - ((self._game.camera_y - self.rect.y)))
-        self._game.screen.blit(self._image, 
-                               ((self._game.screen_size[0] / 2) - ((self._game.camera_x - self.rect.x)),
-                                (self._game.screen_size[1] / 2) - ((self._game.camera_y - self.rect.y))))
-
-        # everything which touch an edge explodes
-        for caught in pygame.sprite.spritecollide(self, self._game.all, False):
-            if not self._game.edge.has(caught):
-                caught.explode()
-
-
-class Shine(Surface): # should be child of pygame.sprite due to performance issue
-    """lights and shines, child of Surface"""
-
-    def __init__(self, game, position, angle, image=None,
-                 spin=0, dimension=[5, 2], color=(155, 155, 0),
-                 speed=None):
-        if image:
-            super().__init__(game, image, position, False,  debuggable=False)
-        else:
-            super().__init__(game, pygame.Surface(dimension, pygame.SRCALPHA).convert_alpha(),
-                            position, False,  debuggable=False)
-            self._image.fill(color)
-            self._color = color
-
-        self._angle = random.randint(0, 360)
-        if speed is None:
-            self._speed = [(-math.cos(math.radians(angle))) * random.randint(0, 7) + random.uniform(-1, 1),
-                           (math.sin(math.radians(angle))) * random.randint(0, 7) + random.uniform(-1, 1)] 
-        else:
-            self._speed = speed
-        self._time2live = random.randint(5, 100)
-        self._spin = spin
+    def image_handler(self):
+        """Edges never rotate, their position is their top left corner"""
 
-    def explode(self):
-        self.kill()
+        self.rotated_image = self._image
+        self._draw_offset = (0, 0)
 
     def update(self):
-        self._time2live -= 1 / self._game.delta_time
-        if self._time2live < 0:
-            self.kill()
-        Game_Object.update(self) # no spin for shines due to performance issue TODO
+        """Edges never move"""
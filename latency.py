@@ -0,0 +1,136 @@
+import time
+import numpy
+import pygame
+
+
+# traced keys by input type
+KINDS = {pygame.K_UP: "thrust", pygame.K_DOWN: "thrust", pygame.K_q: "thrust",
+         pygame.K_e: "thrust", pygame.K_s: "thrust",
+         pygame.K_LEFT: "rotate", pygame.K_RIGHT: "rotate", pygame.K_w: "rotate",
+         pygame.K_SPACE: "fire", pygame.K_LSHIFT: "fire"}
+
+# lower edges of the histogram bins in ms, the last bin is open
+BINS = (0, 2, 4, 8, 16, 33, 50, 100, 250)
+
+_COLUMNS = ("frame", "key", "type", "pressed", "input_to_step_ms", "step_to_display_ms",
+            "display_ms", "total_ms")
+
+
+class _Input:
+    """A key transition on its way to the screen"""
+
+    def __init__(self, key, pressed, seen):
+        self.key = key
+        self.pressed = pressed
+        self.seen = seen # first read by the main loop
+        self.applied = None # first simulation step whose ship controls reflect it
+
+
+class LatencyTracer:
+    """Input to photon latency of the player ship.
+    Key transitions are timestamped when the main loop first sees them, from the pygame
+    events or from the pressed keys. Ship.controls marks them applied in the first step
+    where the ship acts on them, a press of a fire key once a shot leaves. When
+    display.update returns for the next frame their latency is logged, split in the wait
+    for a simulation step, the simulation and rendering up to the display, and the display
+    update.
+
+    Arguments:
+        path {str} -- CSV log file, one line per input, None for no log
+        max_age {float} -- seconds after which an input never applied is dropped"""
+
+    def __init__(self, path=None, max_age=1.0):
+        self._max_age = max_age
+        self._pressed = {} # key -> last state seen
+        self._pending = []
+        self._records = {kind: [] for kind in set(KINDS.values())} # kind -> stage times
+        self.frames = 0
+        self.dropped = 0
+        self._file = None
+        if path is not None:
+            self._file = open(path, "w")
+            self._file.write(",".join(_COLUMNS) + "\n")
+
+    def seen(self, key, pressed, now=None):
+        """Key {int} is now pressed {bool}, a transition is traced if it was not seen yet"""
+
+        if key not in KINDS or self._pressed.get(key, False) == pressed:
+            return
+        self._pressed[key] = pressed
+        self._pending.append(_Input(key, pressed, time.perf_counter() if now is None else now))
+
+    def sample(self, keys):
+        """Transitions of keys {tuple}, as returned by pygame.key.get_pressed"""
+
+        now = time.perf_counter()
+        for key in KINDS:
+            self.seen(key, bool(keys[key]), now)
+
+    def controls(self, keys, fired):
+        """Ship.controls ran with keys {tuple}, fired {bool} is True when a shot left"""
+
+        now = time.perf_counter()
+        for entry in self._pending:
+            if (entry.applied is None and bool(keys[entry.key]) == entry.pressed and
+                    (fired or not entry.pressed or KINDS[entry.key] != "fire")):
+                entry.applied = now
+
+    def presented(self, display_start):
+        """display.update returned, the applied inputs reached the screen
+
+        Arguments:
+            display_start {float} -- time.perf_counter when display.update was called"""
+
+        now = time.perf_counter()
+        self.frames += 1
+        pending = []
+        for entry in self._pending:
+            if entry.applied is None:
+                if now - entry.seen > self._max_age:
+                    self.dropped += 1
+                else:
+                    pending.append(entry)
+                continue
+            stages = (entry.applied - entry.seen, display_start - entry.applied,
+                      now - display_start, now - entry.seen)
+            self._records[KINDS[entry.key]].append(stages)
+            if self._file is not None:
+                self._file.write("%d,%s,%s,%d,%s\n" % (self.frames, pygame.key.name(entry.key),
+                                                       KINDS[entry.key], entry.pressed,
+                                                       ",".join("%.3f" % (stage * 1000)
+                                                                for stage in stages)))
+        self._pending = pending
+
+    def report(self):
+        """Latency histograms by input type, times in ms
+
+        Returns:
+            dict -- type -> count, total latency percentiles, stage means and histogram"""
+
+        report = {}
+        for kind, records in sorted(self._records.items()):
+            if not records:
+                continue
+            stages = numpy.array(records) * 1000
+            total = stages[:, 3]
+            report[kind] = {"count": len(records),
+                            "mean": float(total.mean()),
+                            "p50": float(numpy.percentile(total, 50)),
+                            "p90": float(numpy.percentile(total, 90)),
+                            "p99": float(numpy.percentile(total, 99)),
+                            "max": float(total.max()),
+                            "stages_mean": {"input_to_step": float(stages[:, 0].mean()),
+                                            "step_to_display": float(stages[:, 1].mean()),
+                                            "display": float(stages[:, 2].mean())},
+                            "histogram": {"bins_ms": list(BINS),
+                                          "counts": numpy.bincount(
+                                              numpy.searchsorted(BINS, total, "right") - 1,
+                                              minlength=len(BINS)).tolist()}}
+        return report
+
+    def close(self):
+        """Close the log file"""
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
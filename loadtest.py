@@ -0,0 +1,121 @@
+"""Multiplayer load test.
+
+Bot clients connect to a server, send changing keys every tick and decode every snapshot,
+then server tick time and bandwidth per client are reported as JSON.
+Without --host a server is started in the same process, headless.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+import client
+import replay
+import server
+
+
+class Bot(client.Client):
+    """Client without window, pressing random keys
+
+    Arguments:
+        seed {int} -- keys random seed"""
+
+    _KEYS = [sum(1 << replay.KEYS.index(key) for key in keys) for keys in
+             [(), (pygame.K_UP,), (pygame.K_UP, pygame.K_LEFT), (pygame.K_UP, pygame.K_RIGHT),
+              (pygame.K_SPACE,), (pygame.K_UP, pygame.K_SPACE), (pygame.K_LEFT, pygame.K_LSHIFT)]]
+
+    def __init__(self, seed, screen_size=(1300, 800)):
+        super().__init__(screen_size)
+        self._random = random.Random(seed)
+        self._mask = 0
+
+    async def play(self, seconds, sim_rate):
+        """Send keys at the simulation rate for seconds {float}"""
+
+        loop = asyncio.get_running_loop()
+        step_time = 1 / sim_rate
+        start = next_time = loop.time()
+        tick = 0
+        while loop.time() - start < seconds:
+            if tick % 30 == 0:
+                self._mask = self._random.choice(self._KEYS)
+            self.send_input(self._mask)
+            tick += 1
+            next_time += step_time
+            await asyncio.sleep(max(0.0, next_time - loop.time()))
+
+
+async def run(clients, seconds, host=None, port=7777, ai_ships=0, seed=0):
+    """Run the bots against a server.
+
+    Arguments:
+        clients {int} -- number of bots
+        seconds {float} -- test duration
+        host {str} -- server address, an in process server is started if None
+        port {int} -- server port
+        ai_ships {int} -- fleet size of the in process server
+        seed {int} -- random seed
+
+    Returns:
+        dict -- results"""
+
+    game_server = transport = simulation = None
+    if host is None:
+        host = "127.0.0.1"
+        loop = asyncio.get_running_loop()
+        game = server.create_game(seed, ai_ships)
+        transport, game_server = await loop.create_datagram_endpoint(
+            lambda: server.Server(game, seed), local_addr=(host, port))
+        simulation = asyncio.ensure_future(game_server.run())
+
+    bots = [await client.connect(Bot(seed + index), host, port) for index in range(clients)]
+    sim_rate = bots[0].welcome["sim_rate"]
+    if game_server is not None:
+        game_server.stats() # measure from here
+        game_server.tick_times.clear()
+    start = time.perf_counter()
+    await asyncio.gather(*(bot.play(seconds, sim_rate) for bot in bots))
+    elapsed = time.perf_counter() - start
+
+    results = {"clients": clients,
+               "seconds": elapsed,
+               "down_bytes_per_client_s": sum(bot.bytes_received for bot in bots) / clients / elapsed,
+               "up_bytes_per_client_s": sum(bot.bytes_sent for bot in bots) / clients / elapsed,
+               "snapshots_per_client_s": sum(bot.snapshots for bot in bots) / clients / elapsed,
+               "dropped_snapshots": sum(bot.dropped for bot in bots)}
+    if game_server is not None:
+        if simulation.done():
+            simulation.result() # raises the server error
+        results["server"] = game_server.stats()
+        simulation.cancel()
+        transport.close()
+    for bot in bots:
+        bot.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shooter multiplayer load test")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--host", help="server address, an in process server is started if missing")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--ai", type=int, default=0, metavar="SHIPS",
+                        help="fleet size of the in process server")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.clients, args.seconds, args.host, args.port, args.ai, args.seed))
+    json.dump(results, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
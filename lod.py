@@ -0,0 +1,106 @@
+import itertools
+import numpy
+
+
+class LevelOfDetail:
+    """Simulation level of detail.
+    Once per tick the distance of every entity from the screen is computed at once, around
+    the simulated position of the camera target. Entities in sight or close to it are updated
+    every step, farther ones every few steps: in between they accumulate their skipped steps
+    in _lag and their next update integrates all of them. Only classes with _lod set are
+    slowed down, the others are updated every step.
+
+    Arguments:
+        game {object} -- game instance
+        rings {tuple} -- (distance, interval) pairs by growing distance: entities at most
+                         distance pixels away from the screen are updated every interval steps
+        far_interval {int} -- update interval of the entities beyond the last ring"""
+
+    def __init__(self, game, rings=((300, 1), (1300, 2)), far_interval=4):
+        self._game = game
+        self._distances = numpy.array([distance for distance, interval in rings], float)
+        self._levels = numpy.array([interval for distance, interval in rings] + [far_interval])
+        self._intervals = {} # entity -> update interval of the current tick
+        self.margin = rings[0][0] # distance from the screen where nothing is slowed down
+        self.enabled = True
+        self.visible = 0 # entities in sight at the last tick
+        self.reduced = 0 # entities updated less than every step
+        self.skipped = 0 # updates skipped at the last tick
+
+    def center(self):
+        """Camera position of the simulation: the camera target position of the current step,
+        it does not depend on rendering so the level of detail stays deterministic
+
+        Returns:
+            tuple: float -- (x, y) screen center in map coordinates"""
+
+        target = self._game.camera_target
+        if target is not None:
+            return target._position[0], target._position[1]
+        return self._game.camera_x, self._game.camera_y
+
+    def camera_speed(self):
+        """Bound of the camera speed on each axis, in pixels per time unit as the speeds of
+        the game objects: the camera target stays within its max speed plus one acceleration
+
+        Returns:
+            float -- 0 without camera target"""
+
+        target = self._game.camera_target
+        if target is None:
+            return 0.0
+        bound = getattr(target, "_max_speed", 0.0) + getattr(target, "_acceleration", 0.0)
+        return max(bound, abs(target._speed[0]), abs(target._speed[1]))
+
+    def update(self):
+        """Update interval of every entity from its distance to the screen, one simulation step"""
+
+        self.skipped = 0
+        if not self.enabled:
+            self._intervals = {}
+            self.visible = self.reduced = 0
+            return
+        entities = list(self._game.entities.members("all"))
+        if not entities:
+            self._intervals = {}
+            return
+        rects = numpy.fromiter(itertools.chain.from_iterable(entity.rect for entity in entities),
+                               numpy.int32, len(entities) * 4).reshape(-1, 4).astype(float)
+        half = rects[:, 2:] / 2
+        center_x, center_y = self.center()
+        screen_w, screen_h = self._game.screen_size
+        # distance between the rect edges and the screen edges, 0 when in sight
+        outside = numpy.maximum(numpy.abs(rects[:, :2] + half - (center_x, center_y)) -
+                                half - (screen_w / 2, screen_h / 2), 0)
+        distance = outside.max(axis=1)
+        intervals = self._levels[numpy.searchsorted(self._distances, distance)]
+        self._intervals = dict(zip(entities, intervals.tolist()))
+        self.visible = int(numpy.count_nonzero(distance == 0))
+        self.reduced = int(numpy.count_nonzero(intervals > 1))
+
+    def due(self, group):
+        """Sprites of group {object} to update this step. The others catch up later, their
+        skipped step is counted in their _lag
+
+        Returns:
+            list -- sprites to update"""
+
+        intervals = self._intervals
+        if not intervals:
+            return group.sprites()
+        due = []
+        for sprite in group.sprites():
+            if not sprite._lod or sprite._lag + 1 >= intervals.get(sprite, 1):
+                due.append(sprite)
+            else:
+                sprite._lag += 1
+                self.skipped += 1
+        return due
+
+    def stats(self):
+        """Level of detail counters of the last tick
+
+        Returns:
+            dict -- visible, reduced rate and skipped entities"""
+
+        return {"visible": self.visible, "reduced": self.reduced, "skipped": self.skipped}
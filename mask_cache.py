@@ -0,0 +1,102 @@
+import collections
+import pygame
+import rotation_cache
+
+
+class MaskCache:
+    """Collision masks shared by every game object.
+    Masks are built from the rotated images of the rotation cache, keyed by source surface
+    and angle bucket, so they match the drawn pixels. Used by the precise collision mode
+    after the rect broadphase.
+
+    Arguments:
+        max_bytes {int} -- memory cap of the masks, least recently used are dropped"""
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self._entries = collections.OrderedDict() # (image, bucket) -> (mask, offset)
+        self.max_bytes = max_bytes
+        self.clear()
+
+    def clear(self):
+        """Drop every mask and reset the counters"""
+
+        self._entries.clear()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tests = 0 # pixel tests
+        self.rejected = 0 # rect overlaps without pixel overlap
+
+    def get(self, image, angle):
+        """Mask of image rotated by angle and its placement.
+
+        Arguments:
+            image {object} -- source pygame surface
+            angle {float} -- angle in degrees
+
+        Returns:
+            tuple -- (mask, offset), offset is the mask top left corner from the object position"""
+
+        key = (image, rotation_cache.cache.bucket(angle))
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        rotated, min_box, max_box, pivot_move = rotation_cache.cache.rotate(image, angle)
+        size = image.get_size()
+        # same placement as Game_Object.image_handler
+        entry = (pygame.mask.from_surface(rotated),
+                 (-size[0] / 2 + min_box[0] - pivot_move[0],
+                  -size[1] / 2 - max_box[1] + pivot_move[1]))
+        self._entries[key] = entry
+        self._bytes += _size_of(entry[0])
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            old = self._entries.popitem(last=False)[1]
+            self._bytes -= _size_of(old[0])
+            self.evictions += 1
+        return entry
+
+    def overlap(self, first, second):
+        """Game objects first and second {object} have overlapping pixels
+
+        Returns:
+            bool -- True when they touch"""
+
+        self.tests += 1
+        first_mask, first_offset = self.get(first._image, first._angle)
+        second_mask, second_offset = self.get(second._image, second._angle)
+        offset = (round(second._position[0] + second_offset[0] - first._position[0] - first_offset[0]),
+                  round(second._position[1] + second_offset[1] - first._position[1] - first_offset[1]))
+        if first_mask.overlap(second_mask, offset) is None:
+            self.rejected += 1
+            return False
+        return True
+
+    def stats(self):
+        """Cache and test counters
+
+        Returns:
+            dict -- hits, misses, evictions, entries, bytes, hit_rate, tests and rejected"""
+
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "tests": self.tests,
+                "rejected": self.rejected}
+
+
+def _size_of(mask):
+    width, height = mask.get_size()
+    return (width + 7) // 8 * height
+
+
+# process wide cache
+cache = MaskCache()
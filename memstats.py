@@ -0,0 +1,274 @@
+import gc
+import json
+import sys
+import tracemalloc
+import types
+import numpy
+import pygame
+import game_object
+import mask_cache
+import rotation_cache
+
+
+# attribute values counted in the size of the object holding them
+_OWNED = (list, tuple, dict, set, float, pygame.Rect, numpy.ndarray)
+# (game component or None for the game, attribute) which keep following an object after it
+# is killed, e.g. the camera stays on the destroyed player ship
+_ROLES = ((None, "camera_target"), (None, "user"), (None, "base"), ("fleet", "_center"))
+# (game component, attribute) rebuilt every step: an object killed during the step stays in
+# them until the next one, they are not leaks
+_PER_TICK = (("lod", "_intervals"), ("target_grid", "_cells"), ("asteroid_grid", "_cells"),
+             ("target_index", "_targets"), ("target_index", "_indexes"))
+
+
+class MemoryStats:
+    """Memory accounting of the game objects and leak detector, for long and soak runs.
+    Every interval steps a sample is taken: live objects and their estimated bytes per class,
+    pixel bytes of the surfaces they own, memory of the shared caches, tracemalloc diff with
+    the previous sample and the killed objects still referenced from somewhere. Killed
+    objects only referenced by the game roles, such as the camera target or the base, are
+    listed apart from the leaks, those only found in the caches rebuilt every step are not
+    reported.
+    A surface is owned by the first object holding it unless it is a loaded asset or a
+    rotation cache entry, which are counted once with the caches. Objects are found with
+    the garbage collector, so an object out of the entity store, of the pygame groups and of
+    the pool free lists which is still in memory is leaked by its referrers.
+
+    Arguments:
+        game {object} -- game instance
+        interval {int} -- steps between two samples
+        trace {bool} -- trace python allocations with tracemalloc, slows the game down
+        top {int} -- allocation sites kept in each tracemalloc diff
+        max_leaks {int} -- leaked objects whose referrers are looked for in each sample"""
+
+    def __init__(self, game, interval=3600, trace=True, top=10, max_leaks=20):
+        self._game = game
+        self._interval = interval
+        self._top = top
+        self._max_leaks = max_leaks
+        self._ticks = 0
+        self._snapshot = None
+        self._started = trace and not tracemalloc.is_tracing() # stopped by close
+        self.samples = []
+        if self._started:
+            tracemalloc.start()
+        if trace:
+            self._snapshot = self._take_snapshot()
+
+    def tick(self):
+        """Count a simulation step, a sample is taken every interval steps"""
+
+        self._ticks += 1
+        if self._ticks % self._interval == 0:
+            self.sample()
+
+    def sample(self):
+        """Measure the memory now, the sample is added to samples
+
+        Returns:
+            dict -- tick, classes, caches, leaks, held and allocations"""
+
+        gc.collect() # unreachable cycles are not leaks
+        objects = [obj for obj in gc.get_objects() if isinstance(obj, game_object.Game_Object)]
+        classes, killed = self._census(objects)
+        roles = self._roles()
+        # role objects first, they do not take the place of suspects
+        suspects = ([obj for obj in killed if id(obj) in roles] +
+                    [obj for obj in killed if id(obj) not in roles])
+        holders = _Holders([self._game, rotation_cache.cache, mask_cache.cache] + objects)
+        ignored = {id(objects), id(killed), id(suspects), id(holders._attributes)}
+        ignored.update(self._per_tick())
+        labels = set().union(*roles.values())
+        leaks, held = [], []
+        for obj in suspects:
+            if len(leaks) == self._max_leaks:
+                break
+            leak = self._leak(obj, holders, ignored)
+            if not leak["referrers"]:
+                continue # only in the per tick caches
+            # held by a role and by something else is still a leak
+            (held if set(leak["referrers"]) <= labels else leaks).append(leak)
+        sample = {"tick": self._ticks,
+                  "classes": classes,
+                  "caches": self._caches(),
+                  "killed_referenced": len(killed),
+                  "leaks": leaks,
+                  "held": held}
+        if self._snapshot is not None:
+            snapshot = self._take_snapshot()
+            sample["traced_kb"] = tracemalloc.get_traced_memory()[0] // 1024
+            sample["allocations"] = [{"where": "%s:%d" % (stat.traceback[0].filename,
+                                                          stat.traceback[0].lineno),
+                                      "size_kb": stat.size // 1024,
+                                      "size_diff_kb": stat.size_diff // 1024,
+                                      "count_diff": stat.count_diff}
+                                     for stat in snapshot.compare_to(self._snapshot, "lineno")
+                                     [:self._top]]
+            self._snapshot = snapshot
+        self.samples.append(sample)
+        return sample
+
+    def _census(self, objects):
+        """Counts and bytes per class of objects {list}, and the killed objects among them"""
+
+        shared = {id(surface) for surface in self._game.assets.surfaces()}
+        shared.update(id(surface) for surface in rotation_cache.cache.surfaces())
+        free = {id(obj) for pool in (self._game.bullet_pool, self._game.missile_pool)
+                for obj in pool._free}
+        owned = set() # surfaces already counted
+        classes = {}
+        killed = []
+        for obj in objects:
+            entry = classes.get(type(obj).__name__)
+            if entry is None:
+                entry = classes[type(obj).__name__] = {"live": 0, "registered": 0, "pooled": 0,
+                                                       "killed": 0, "bytes": 0,
+                                                       "surface_bytes": 0}
+            entry["live"] += 1
+            if obj._slot is not None:
+                entry["registered"] += 1
+            elif id(obj) in free:
+                entry["pooled"] += 1
+            elif not obj.alive():
+                entry["killed"] += 1
+                killed.append(obj)
+            entry["bytes"] += sys.getsizeof(obj) + sys.getsizeof(obj.__dict__)
+            for value in obj.__dict__.values():
+                if isinstance(value, pygame.Surface):
+                    if id(value) not in shared and id(value) not in owned:
+                        owned.add(id(value))
+                        entry["surface_bytes"] += _surface_bytes(value)
+                elif isinstance(value, _OWNED):
+                    entry["bytes"] += sys.getsizeof(value)
+        return classes, killed
+
+    def _roles(self):
+        """Objects of the game roles, id -> attribute labels as named by _Holders"""
+
+        roles = {}
+        for component, name in _ROLES:
+            owner = self._game if component is None else getattr(self._game, component, None)
+            value = getattr(owner, name, None)
+            if value is not None:
+                roles.setdefault(id(value), set()).add("%s.%s" % (type(owner).__name__, name))
+        return roles
+
+    def _per_tick(self):
+        """Ids of the per tick caches and of the cell lists of the grids"""
+
+        ids = set()
+        for component, name in _PER_TICK:
+            container = getattr(getattr(self._game, component, None), name, None)
+            if container is not None:
+                ids.add(id(container))
+                if isinstance(container, dict):
+                    ids.update(id(value) for value in container.values() if isinstance(value, list))
+        return ids
+
+    def _caches(self):
+        """Memory of the shared images and caches"""
+
+        loaded = self._game.assets.surfaces()
+        rotated = rotation_cache.cache.surfaces()
+        masks = mask_cache.cache.stats()
+        return {"assets": {"surfaces": len(loaded),
+                           "surface_bytes": sum(map(_surface_bytes, loaded))},
+                "rotation_cache": {"surfaces": len(rotated),
+                                   "surface_bytes": sum(map(_surface_bytes, rotated))},
+                "mask_cache": {"entries": masks["entries"], "bytes": masks["bytes"]},
+                "particles": self._game.particles.memory()}
+
+    def _leak(self, obj, holders, ignored):
+        """Description of a killed object {object} and of what still references it, named by
+        holders {_Holders}, but the containers whose id is in ignored {set}"""
+
+        referrers = []
+        for referrer in gc.get_referrers(obj):
+            if id(referrer) not in ignored and not isinstance(referrer, types.FrameType):
+                referrers.extend(holders.describe(referrer, obj))
+        return {"class": type(obj).__name__, "referrers": sorted(referrers)}
+
+    def _take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),
+             tracemalloc.Filter(False, "<frozen importlib._bootstrap>")))
+
+    def report(self):
+        """Every sample and the growth from the first sample to the last one
+
+        Returns:
+            dict -- interval, samples and growth, class -> live and bytes differences"""
+
+        growth = {}
+        if self.samples:
+            first, last = self.samples[0]["classes"], self.samples[-1]["classes"]
+            empty = {"live": 0, "bytes": 0, "surface_bytes": 0}
+            for name in sorted(set(first) | set(last)):
+                before, after = first.get(name, empty), last.get(name, empty)
+                growth[name] = {"live": after["live"] - before["live"],
+                                "bytes": (after["bytes"] + after["surface_bytes"] -
+                                          before["bytes"] - before["surface_bytes"])}
+        return {"interval": self._interval, "samples": self.samples, "growth": growth}
+
+    def dump(self, path):
+        """Write the report to the JSON file path {str}"""
+
+        with open(path, "w") as file:
+            json.dump(self.report(), file, indent=2)
+
+    def close(self):
+        """Stop tracing allocations"""
+
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+        self._snapshot = None
+
+
+def _surface_bytes(surface):
+    return surface.get_pitch() * surface.get_height()
+
+
+class _Holders:
+    """Names of the attributes of the game, of its components and of the game objects, to
+    tell where a referrer found by the garbage collector belongs
+
+    Arguments:
+        roots {list} -- game objects and the game, its attributes are indexed too"""
+
+    def __init__(self, roots):
+        self._attributes = {} # id of an object __dict__ -> object
+        self._containers = {} # id of a container -> owner class and attribute
+        owners = list(roots)
+        for value in vars(roots[0]).values(): # game components
+            if hasattr(value, "__dict__") and not isinstance(value, (type, types.ModuleType)):
+                owners.append(value)
+        for owner in owners:
+            attributes = vars(owner)
+            self._attributes[id(attributes)] = owner
+            for name, value in attributes.items():
+                label = "%s.%s" % (type(owner).__name__, name)
+                self._containers.setdefault(id(value), label)
+                # nested containers, e.g. grid cells or sprite lists by key
+                nested = value.values() if isinstance(value, dict) else value
+                if isinstance(value, (dict, list)):
+                    for item in nested:
+                        if isinstance(item, (dict, list, set)):
+                            self._containers.setdefault(id(item), label + "[]")
+
+    def describe(self, referrer, obj):
+        """Where referrer {object} holds obj {object}: owner class and attribute of every
+        attribute holding it, or the container type when unknown
+
+        Returns:
+            list -- labels"""
+
+        owner = self._attributes.get(id(referrer))
+        if owner is None and hasattr(referrer, "__dict__") and not isinstance(referrer, type):
+            owner = referrer
+        if owner is not None:
+            labels = ["%s.%s" % (type(owner).__name__, name)
+                      for name, value in vars(owner).items() if value is obj]
+            if labels:
+                return labels
+        return [self._containers.get(id(referrer), type(referrer).__name__)]
@@ -0,0 +1,237 @@
+import struct
+
+
+# protocol version, bump when a message layout changes
+PROTOCOL = 1
+
+# message types, first byte of every datagram
+HELLO, WELCOME, INPUT, SNAPSHOT, BYE = range(5)
+
+# entity kinds, index of the image name of the entity
+KINDS = ("ship.png", "bullet.png", "missile.png", "asteroid.png", "base.png")
+
+# settings of the players ships, same as the TestGame user
+SHIP = {"acceleration": 0.7, "h_acceleration": 0.4, "spin": 10, "max_speed": 10.0,
+        "bullet_speed": 12.0, "fire_rate": 8}
+
+POSITION_SCALE = 4 # positions are sent in quarter pixels
+ANGLE_SCALE = 256 / 360 # angles are sent in 256 steps
+INPUT_REDUNDANCY = 4 # inputs repeated in every input message, against losses
+MAX_ENTITIES = 96 # entity updates per snapshot, the farthest wait for the next ones
+VIEW_MARGIN = 200 # pixels sent around the client screen
+
+# type, protocol, client screen size
+_HELLO = struct.Struct("<BHHH")
+# type, client id, ship id, map size, simulation rate, snapshot interval in ticks, seed
+_WELCOME = struct.Struct("<BIIHHHHI")
+# type, newest input sequence, last snapshot received, number of key masks
+_INPUT = struct.Struct("<BIIB")
+# type, sequence, baseline sequence, server tick, last input processed, own ship id,
+# x, y, speed x, speed y, angle, life, removed entities, changed entities
+_SNAPSHOT = struct.Struct("<BIIIIIfffffhHH")
+_MASK = struct.Struct("<H")
+_ID = struct.Struct("<I")
+_NEW = struct.Struct("<BHHB") # kind, x, y, angle
+_POSITION = struct.Struct("<HH")
+_SMALL_MOVE = struct.Struct("<bb")
+_ANGLE = struct.Struct("<B")
+
+# entity flags
+_FLAG_NEW, _FLAG_POSITION, _FLAG_SMALL_MOVE, _FLAG_ANGLE = 1, 2, 4, 8
+
+
+def entity_id(handle):
+    """Network id of an entity store handle {tuple}: slot in the low 16 bits, generation
+    in the high ones. Raises ValueError when the slot does not fit, instead of sending an
+    id colliding with another entity"""
+
+    slot, generation = handle
+    if slot > 0xffff:
+        raise ValueError("entity slot %d does not fit in a network id, at most 65536 slots"
+                         % slot)
+    return slot & 0xffff | (generation & 0xffff) << 16
+
+
+def quantize(kind, position, angle):
+    """Network state of an entity.
+
+    Arguments:
+        kind {int} -- index in KINDS
+        position {tuple: float} -- [x, y] map position
+        angle {float} -- angle in degrees
+
+    Returns:
+        tuple -- (kind, x, y, angle) integers"""
+
+    return (kind,
+            min(max(int(position[0] * POSITION_SCALE), 0), 0xffff),
+            min(max(int(position[1] * POSITION_SCALE), 0), 0xffff),
+            int(angle % 360 * ANGLE_SCALE) & 0xff)
+
+
+def dequantize(state):
+    """Map position and angle of a network state
+
+    Returns:
+        tuple -- (x, y, angle)"""
+
+    return state[1] / POSITION_SCALE, state[2] / POSITION_SCALE, state[3] / ANGLE_SCALE
+
+
+def encode_hello(screen_size):
+    return _HELLO.pack(HELLO, PROTOCOL, screen_size[0], screen_size[1])
+
+
+def decode_hello(data):
+    """Hello message fields
+
+    Returns:
+        tuple -- (protocol, screen size)"""
+
+    kind, protocol, screen_w, screen_h = _HELLO.unpack_from(data)
+    return protocol, (screen_w, screen_h)
+
+
+def encode_welcome(client_id, ship_id, map_size, sim_rate, snapshot_interval, seed):
+    return _WELCOME.pack(WELCOME, client_id, ship_id, map_size[0], map_size[1],
+                         sim_rate, snapshot_interval, seed)
+
+
+def decode_welcome(data):
+    """Welcome message fields
+
+    Returns:
+        dict -- client_id, ship_id, map_size, sim_rate, snapshot_interval and seed"""
+
+    (kind, client_id, ship_id, map_w, map_h, sim_rate,
+     snapshot_interval, seed) = _WELCOME.unpack_from(data)
+    return {"client_id": client_id, "ship_id": ship_id, "map_size": (map_w, map_h),
+            "sim_rate": sim_rate, "snapshot_interval": snapshot_interval, "seed": seed}
+
+
+def encode_input(sequence, ack, masks):
+    """Input message.
+
+    Arguments:
+        sequence {int} -- sequence of the newest input
+        ack {int} -- last snapshot received
+        masks {list: int} -- key masks, newest first
+
+    Returns:
+        bytes -- datagram"""
+
+    masks = masks[:INPUT_REDUNDANCY]
+    return _INPUT.pack(INPUT, sequence, ack, len(masks)) + b"".join(_MASK.pack(mask) for mask in masks)
+
+
+def decode_input(data):
+    """Input message fields
+
+    Returns:
+        tuple -- (sequence, ack, masks newest first)"""
+
+    kind, sequence, ack, count = _INPUT.unpack_from(data)
+    masks = [_MASK.unpack_from(data, _INPUT.size + index * _MASK.size)[0] for index in range(count)]
+    return sequence, ack, masks
+
+
+def encode_snapshot(header, baseline, visible, max_entities=MAX_ENTITIES):
+    """Snapshot message, entities are delta encoded against the baseline acknowledged by
+    the client: unchanged entities are skipped, moves under 32 pixels take 2 bytes.
+
+    Arguments:
+        header {tuple} -- sequence, baseline sequence, tick, last input processed, ship id,
+                          x, y, speed x, speed y, angle and life of the client ship
+        baseline {dict} -- id -> network state known by the client, empty if none
+        visible {list: tuple} -- (id, network state) of the entities in view, nearest first
+        max_entities {int} -- max entity updates, the others keep their baseline state
+
+    Returns:
+        tuple -- (datagram, id -> network state known by the client once received)"""
+
+    state = {}
+    changes = []
+    for identifier, new in visible:
+        old = baseline.get(identifier)
+        if old == new or (old is not None and len(changes) >= max_entities):
+            state[identifier] = old
+            continue
+        if len(changes) >= max_entities:
+            continue
+        state[identifier] = new
+        record = _ID.pack(identifier)
+        if old is None or old[0] != new[0]:
+            changes.append(record + bytes((_FLAG_NEW,)) + _NEW.pack(*new))
+            continue
+        flags = 0
+        payload = b""
+        if old[1:3] != new[1:3]:
+            move_x, move_y = new[1] - old[1], new[2] - old[2]
+            if -128 <= move_x < 128 and -128 <= move_y < 128:
+                flags |= _FLAG_SMALL_MOVE
+                payload += _SMALL_MOVE.pack(move_x, move_y)
+            else:
+                flags |= _FLAG_POSITION
+                payload += _POSITION.pack(new[1], new[2])
+        if old[3] != new[3]:
+            flags |= _FLAG_ANGLE
+            payload += _ANGLE.pack(new[3])
+        changes.append(record + bytes((flags,)) + payload)
+
+    removed = [identifier for identifier in baseline if identifier not in state]
+    data = (_SNAPSHOT.pack(SNAPSHOT, *header, len(removed), len(changes)) +
+            b"".join(_ID.pack(identifier) for identifier in removed) +
+            b"".join(changes))
+    return data, state
+
+
+def decode_snapshot(data, baselines):
+    """Decode a snapshot message.
+
+    Arguments:
+        data {bytes} -- datagram
+        baselines {dict} -- sequence -> states of the snapshots received
+
+    Returns:
+        tuple -- (header dict, id -> network state), None when the baseline is unknown"""
+
+    fields = _SNAPSHOT.unpack_from(data)
+    (kind, sequence, baseline_sequence, tick, input_sequence, ship_id,
+     x, y, speed_x, speed_y, angle, life, removed, changed) = fields
+    if baseline_sequence:
+        baseline = baselines.get(baseline_sequence)
+        if baseline is None:
+            return None
+        state = dict(baseline)
+    else:
+        state = {}
+
+    offset = _SNAPSHOT.size
+    for index in range(removed):
+        state.pop(_ID.unpack_from(data, offset)[0], None)
+        offset += _ID.size
+    for index in range(changed):
+        identifier = _ID.unpack_from(data, offset)[0]
+        flags = data[offset + _ID.size]
+        offset += _ID.size + 1
+        if flags & _FLAG_NEW:
+            state[identifier] = _NEW.unpack_from(data, offset)
+            offset += _NEW.size
+            continue
+        entity_kind, entity_x, entity_y, entity_angle = state[identifier]
+        if flags & _FLAG_SMALL_MOVE:
+            move_x, move_y = _SMALL_MOVE.unpack_from(data, offset)
+            entity_x, entity_y = entity_x + move_x, entity_y + move_y
+            offset += _SMALL_MOVE.size
+        elif flags & _FLAG_POSITION:
+            entity_x, entity_y = _POSITION.unpack_from(data, offset)
+            offset += _POSITION.size
+        if flags & _FLAG_ANGLE:
+            entity_angle = _ANGLE.unpack_from(data, offset)[0]
+            offset += _ANGLE.size
+        state[identifier] = (entity_kind, entity_x, entity_y, entity_angle)
+
+    header = {"sequence": sequence, "baseline": baseline_sequence, "tick": tick,
+              "input_sequence": input_sequence, "ship_id": ship_id, "position": (x, y),
+              "speed": (speed_x, speed_y), "angle": angle, "life": life}
+    return header, state
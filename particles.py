@@ -0,0 +1,235 @@
+import random
+import numpy
+import pygame
+
+
+class ParticleSystem:
+    """Lights and shines stored in contiguous numpy arrays.
+    Particles are integrated, culled and drawn in batch instead of being one sprite each.
+
+    Arguments:
+        game {object} -- game instance
+        capacity {int} -- max number of live particles, extra emissions are dropped
+        rotations {int} -- pre-rotated variants generated for every particle image
+        palette_size {int} -- number of colors used by random colored explosions"""
+
+    def __init__(self, game, capacity=32768, rotations=8, palette_size=64):
+        self._game = game
+        self._capacity = capacity
+        self._rotations = rotations
+        self._count = 0
+        self.budget = capacity # max live particles, lowered by the spawn director
+        self.dropped = 0 # emissions over budget
+        self.culled = 0 # particles expired off screen without being simulated
+
+        # particle attributes, one row per particle
+        self._position = numpy.zeros((capacity, 2), numpy.float32)
+        self._speed = numpy.zeros((capacity, 2), numpy.float32)
+        self._time2live = numpy.zeros(capacity, numpy.float32)
+        self._sprite = numpy.zeros(capacity, numpy.int32) # index in self._surfaces
+
+        # particle images: every registered image is rotated in advance
+        self._surfaces = numpy.empty(0, object)
+        self._offsets = numpy.zeros((0, 2), numpy.float32) # half size of each surface
+        self._variants = {} # source image -> indexes of its rotated variants
+        self._colors = {} # (color, dimension) -> filled surface
+
+        self._rng = numpy.random.default_rng(random.getrandbits(32))
+        self._palette = numpy.concatenate(
+            [self._get_variants(self.color((random.randint(1, 255),
+                                            random.randint(1, 255),
+                                            random.randint(1, 255))))
+             for x in range(palette_size)])
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        """Remove every particle"""
+
+        self._count = 0
+
+    def stats(self):
+        """Particle counters
+
+        Returns:
+            dict -- live particles, capacity, budget, dropped emissions, culled particles,
+                    cached colors and surfaces"""
+
+        return {"live": self._count,
+                "capacity": self._capacity,
+                "budget": self.budget,
+                "dropped": self.dropped,
+                "culled": self.culled,
+                "colors": len(self._colors),
+                "surfaces": len(self._surfaces)}
+
+    def memory(self):
+        """Memory held by the particles
+
+        Returns:
+            dict -- bytes of the particle arrays, number and pixel bytes of the particle images"""
+
+        arrays = (self._position, self._speed, self._time2live, self._sprite, self._offsets,
+                  self._palette)
+        surfaces = list(self._surfaces) + list(self._colors.values())
+        return {"array_bytes": sum(array.nbytes for array in arrays),
+                "surfaces": len(surfaces),
+                "surface_bytes": sum(surface.get_pitch() * surface.get_height()
+                                     for surface in surfaces)}
+
+    def color(self, color, dimension=(5, 2)):
+        """Filled particle surface, created once for each color and dimension.
+
+        Arguments:
+            color {tuple: int} -- RGB color
+            dimension {tuple: int} -- surface size
+
+        Returns:
+            object -- pygame surface"""
+
+        key = (tuple(color), tuple(dimension))
+        surface = self._colors.get(key)
+        if surface is None:
+            surface = pygame.Surface(dimension, pygame.SRCALPHA).convert_alpha()
+            surface.fill(color)
+            self._colors[key] = surface
+        return surface
+
+    def _get_variants(self, image):
+        """Indexes of the rotated variants of image, rotating it on first use"""
+
+        variants = self._variants.get(image)
+        if variants is None:
+            rotated = [pygame.transform.rotate(image, x * 360 / self._rotations)
+                       for x in range(self._rotations)]
+            first = len(self._surfaces)
+            surfaces = numpy.empty(first + len(rotated), object)
+            surfaces[:first] = self._surfaces
+            for x, surface in enumerate(rotated):
+                surfaces[first + x] = surface
+            self._surfaces = surfaces
+            self._offsets = numpy.concatenate(
+                [self._offsets,
+                 numpy.array([surface.get_size() for surface in rotated], numpy.float32) / 2])
+            variants = numpy.arange(first, first + len(rotated), dtype=numpy.int32)
+            self._variants[image] = variants
+        return variants
+
+    def emit(self, position, count=1, angle=None, image=None, speed=None):
+        """Spawn particles at position.
+
+        Arguments:
+            position {tuple: float} -- [x, y] spawn point, or (count, 2) array of spawn points
+            count {int} -- number of particles
+            angle {float or array: float} -- direction in degrees, random if None
+            image {object} -- particle surface, random colored if None
+            speed {float} -- fixed speed, random speed with noise if None"""
+
+        free = min(self._capacity, self.budget) - self._count
+        self.dropped += max(0, count - free)
+        count = min(count, free)
+        if count <= 0:
+            return
+        # per particle arguments are cut with count when the system is full
+        position = numpy.asarray(position, numpy.float32)
+        if position.ndim == 2:
+            position = position[:count]
+        if numpy.ndim(angle) == 1:
+            angle = angle[:count]
+        new = slice(self._count, self._count + count)
+
+        if angle is None:
+            angle = self._rng.integers(1, 361, count)
+        radians = numpy.radians(numpy.broadcast_to(numpy.asarray(angle, numpy.float32), (count,)))
+        direction = numpy.column_stack((-numpy.cos(radians), numpy.sin(radians)))
+        if speed is None:
+            self._speed[new] = (direction * self._rng.integers(0, 8, (count, 1)) +
+                                self._rng.uniform(-1, 1, (count, 2)))
+        else:
+            self._speed[new] = direction * speed
+
+        self._position[new] = position
+        self._time2live[new] = self._rng.integers(5, 101, count)
+        if image is None:
+            self._sprite[new] = self._rng.choice(self._palette, count)
+        else:
+            self._sprite[new] = self._rng.choice(self._get_variants(image), count)
+
+        # particles which can not reach the screen are not kept
+        reachable = self._reachable(new)
+        if reachable is not None and not reachable.all():
+            keep = numpy.flatnonzero(reachable) + new.start
+            self.culled += count - len(keep)
+            count = len(keep)
+            for array in (self._position, self._speed, self._time2live, self._sprite):
+                array[new.start:new.start + count] = array[keep]
+        self._count += count
+
+    def _reachable(self, rows):
+        """Particles of rows {slice} which may enter the screen before they die: on both axes
+        their distance from the screen is within their remaining travel plus the camera
+        travel at full speed in the same time and the level of detail margin
+
+        Returns:
+            array -- bool per particle, None when the level of detail is disabled"""
+
+        lod = self._game.lod
+        if not lod.enabled:
+            return None
+        half_screen = numpy.array(self._game.screen_size, numpy.float32) / 2
+        outside = numpy.maximum(numpy.abs(self._position[rows] - lod.center()) - half_screen, 0)
+        # a particle moves speed / delta_time for time2live * delta_time steps, so does the camera
+        reach = ((numpy.abs(self._speed[rows]) + lod.camera_speed()) * self._time2live[rows, None] +
+                 lod.margin)
+        return (outside <= reach).all(axis=1)
+
+    def update(self):
+        """Move every particle and remove the dead ones in a single step"""
+
+        count = self._count
+        if not count:
+            return
+        position = self._position[:count]
+        position += self._speed[:count] / self._game.delta_time
+        self._time2live[:count] -= 1 / self._game.delta_time
+
+        # particles die when their time is over, when they touch an edge or when they can not
+        # reach the screen anymore
+        bounds = self._game.bounds
+        alive = ((self._time2live[:count] >= 0) &
+                 (position[:, 0] >= bounds.left) & (position[:, 0] < bounds.right) &
+                 (position[:, 1] >= bounds.top) & (position[:, 1] < bounds.bottom))
+        reachable = self._reachable(slice(0, count))
+        if reachable is not None:
+            self.culled += int(numpy.count_nonzero(alive & ~reachable))
+            alive &= reachable
+        if not alive.all():
+            keep = numpy.flatnonzero(alive)
+            self._count = len(keep)
+            for array in (self._position, self._speed, self._time2live, self._sprite):
+                array[:self._count] = array[keep]
+
+    def draw(self, alpha=1.0):
+        """Blit the particles in sight with a single call
+
+        Arguments:
+            alpha {float} -- interpolation between the last two simulation steps"""
+
+        count = self._count
+        if not count:
+            return
+        sprite = self._sprite[:count]
+        screen_position = (self._position[:count] - self._offsets[sprite] -
+                           self._speed[:count] * ((1 - alpha) / self._game.delta_time) -
+                           (self._game.camera_x - self._game.screen_size[0] / 2,
+                            self._game.camera_y - self._game.screen_size[1] / 2))
+        in_screen = numpy.flatnonzero((screen_position[:, 0] > -10) &
+                                      (screen_position[:, 0] < self._game.screen_size[0]) &
+                                      (screen_position[:, 1] > -10) &
+                                      (screen_position[:, 1] < self._game.screen_size[1]))
+        # integer coordinate lists are much faster to build than a list of pairs
+        screen_position = screen_position[in_screen].astype(numpy.int32)
+        blits = zip(self._surfaces[sprite[in_screen]].tolist(),
+                    zip(screen_position[:, 0].tolist(), screen_position[:, 1].tolist()))
+        self._game.renderer.blits(blits)
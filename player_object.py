@@ -1,5 +1,5 @@
 import math
-import random
+import numpy
 import pygame
 import game_object
 
@@ -21,7 +21,10 @@ class Ship(game_object.Game_Object):
                                scrolling = locked camera on player ship
         controlled {bool}  -- ship is controlled by user
         need_max_rect {bool} -- rect size is the first diagonal"""
-    
+
+    _layer = 1
+    _trails = True # thrust particles, off while a client replays inputs
+
     def __init__(self, game, image, start_pos, acceleration,
                  h_acceleration, spin, max_speed, bullet_speed,
                  fire_rate, camera_mode='normal', controlled=False,
@@ -38,8 +41,8 @@ class Ship(game_object.Game_Object):
         self._bullet_speed = bullet_speed
         self._fire_rate = fire_rate
         self._bullet_timer = 0
-        self._bullet_image = pygame.image.load("Images/bullet.png").convert_alpha()
-        self._missile_image = pygame.image.load("Images/missile.png").convert_alpha()
+        self._bullet_image = self._game.assets.load("bullet.png")
+        self._missile_image = self._game.assets.load("missile.png")
         self._controlled = controlled
 
     def __str__(self):
@@ -78,10 +81,9 @@ class Ship(game_object.Game_Object):
                                 self._max_speed * -sin90]
 
         if pressedKeys[pygame.K_UP]:
-            shine = game_object.Shine(self._game, [self.rect.centerx, self.rect.centery],
-                                      self._angle, image=self._game.white_shine)
-            self._game.environment.add(shine)
-            self._game.all.add(shine)
+            if self._trails:
+                self._game.particles.emit([self.rect.centerx, self.rect.centery],
+                                          angle=self._angle, image=self._game.white_shine)
 
             if rel_max_speed[0] > 0:
                 if self._speed[0] <= rel_max_speed[0]:
@@ -98,10 +100,9 @@ class Ship(game_object.Game_Object):
                     self._speed[1] += self._acceleration * -sin / self._game.delta_time
 
         elif pressedKeys[pygame.K_DOWN]:
-            shine = game_object.Shine(self._game, [self.rect.centerx, self.rect.centery],
-                                      self._angle + 180, image=self._game.white_shine)
-            self._game.environment.add(shine)
-            self._game.all.add(shine)
+            if self._trails:
+                self._game.particles.emit([self.rect.centerx, self.rect.centery],
+                                          angle=self._angle + 180, image=self._game.white_shine)
 
             if rel_max_speed[0] > 0:
                 if self._speed[0] >= -rel_max_speed[0]:
@@ -162,20 +163,23 @@ class Ship(game_object.Game_Object):
         if pressedKeys[pygame.K_s]:
             self._speed = [0, 0]
 
+        fired = False
         if pressedKeys[pygame.K_SPACE] and self._bullet_timer <= 0:
+            fired = True
             self._bullet_timer = self._fire_rate
-            new_bullet = Bullet(self._game, self._bullet_image,
-                                self._position, self._angle, self._bullet_speed,
-                                self)
-            self._game.bullets.add(new_bullet)
-            self._game.all.add(new_bullet)
+            new_bullet = self._game.bullet_pool.acquire(self._bullet_image, self._position,
+                                                        self._angle, self._bullet_speed, self)
+            self._game.spawn(new_bullet, "bullets", "all")
         
         if pressedKeys[pygame.K_LSHIFT] and self._bullet_timer <= 0:
+            fired = True
             self._bullet_timer = self._fire_rate
-            new_missile = Missile(self._game, self._missile_image,
-                                  self._position, self._angle, self)
-            self._game.bullets.add(new_missile)
-            self._game.all.add(new_missile)
+            new_missile = self._game.missile_pool.acquire(self._missile_image, self._position,
+                                                          self._angle, self)
+            self._game.spawn(new_missile, "bullets", "all")
+
+        if self._game.latency is not None:
+            self._game.latency.controls(pressedKeys, fired)
 
     def update(self, pressedKeys):
         """Overriden pygame.sprite.sprite method.
@@ -204,11 +208,22 @@ class Bullet(game_object.Game_Object):
             angle {float} -- angle of the vector in degrees
             bullet_speed {float} -- bullet speed
             owner {object} -- object whose event generated the sprite
+            damage {int} -- damage inflicted to the target
+            targets {object} -- group of the sprites hit, default is the game targets
             """
 
     def __init__(self, game, image, start_pos,
-                 angle, bullet_speed, owner, damage=1):
+                 angle, bullet_speed, owner, damage=1, targets=None):
         super().__init__(game, start_pos, image, True, need_max_rect=True)
+        self._setup(angle, bullet_speed, owner, damage, targets)
+
+    def reset(self, image, start_pos, angle, bullet_speed, owner, damage=1, targets=None):
+        """Reuse a killed bullet, arguments as the constructor but game"""
+
+        self.reset_object(start_pos, image, need_max_rect=True)
+        self._setup(angle, bullet_speed, owner, damage, targets)
+
+    def _setup(self, angle, bullet_speed, owner, damage, targets):
         self._angle = angle
         self._spin = 0
         self._bullet_speed = bullet_speed
@@ -216,18 +231,19 @@ class Bullet(game_object.Game_Object):
                        self._bullet_speed * -math.sin(math.radians(self._angle))]
         self._damage = damage
         self._owner = owner
+        self._targets = targets
 
     def explode(self):
         self.kill()
-        for x in range(20):
-            shine = game_object.Shine(self._game, [self.rect.centerx, self.rect.centery],
-                                      self._angle, spin=random.uniform(-2, 2),
-                                      image=self._game.standard_shine)
-            self._game.environment.add(shine)
-            self._game.all.add(shine)
+        self._game.particles.emit([self.rect.centerx, self.rect.centery], 20,
+                                  angle=self._angle, image=self._game.standard_shine)
 
     def update(self):
-        for caught in pygame.sprite.spritecollide(self, self._game.targets, False):
+        if self._targets is None:
+            caught_list = self._game.target_grid.query_rect(self.rect)
+        else:
+            caught_list = pygame.sprite.spritecollide(self, self._targets, False)
+        for caught in self._game.colliding(self, caught_list):
             if caught is not self._owner:
                 self.explode()
                 caught.hit(self._damage)
@@ -250,10 +266,22 @@ class Missile(game_object.Game_Object):
             damage {int} -- damage inflicted to targets
             """
 
+    _lod = True
+
     def __init__(self, game, image, start_pos,
                  angle, owner, spin=1.0, speed=15.0,
                  radius=100.0, damage=10):
         super().__init__(game, start_pos, image, True, True)
+        self._setup(angle, owner, spin, speed, radius, damage)
+
+    def reset(self, image, start_pos, angle, owner, spin=1.0, speed=15.0,
+              radius=100.0, damage=10):
+        """Reuse a killed missile, arguments as the constructor but game"""
+
+        self.reset_object(start_pos, image, need_max_rect=True)
+        self._setup(angle, owner, spin, speed, radius, damage)
+
+    def _setup(self, angle, owner, spin, speed, radius, damage):
         self._owner = owner
         self._angle = angle
         self._missile_speed = speed
@@ -268,31 +296,24 @@ class Missile(game_object.Game_Object):
         """Custom missile explosion"""
 
         self.kill()
-        counter = 0
-        for x in range(59):
-            shine = game_object.Shine(self._game, [self.rect.centerx, self.rect.centery],
-                                      counter, speed=[-math.cos(math.radians(counter)) * 4,
-                                                      math.sin(math.radians(counter)) * 4],
-                                      image=self._game.standard_shine)
-            self._game.environment.add(shine)
-            self._game.all.add(shine)
-            counter += 6
+        self._game.particles.emit([self.rect.centerx, self.rect.centery], 59,
+                                  angle=numpy.arange(0, 354, 6), speed=4,
+                                  image=self._game.standard_shine)
 
     def find_target(self):
-        """Find the closest target"""
+        """Find the closest target through the game target index"""
 
-        target = None
-        for obj in self._game.targets.sprites():
-            if not target:
-                target = obj
-            elif self.distance_from(obj._position) < self.distance_from(target._position):
-                target = obj
-        return target
+        return self._game.target_index.nearest(self._position, exclude=self._owner)
 
     def seek(self):
-        """Seek the chosen target if alive"""
+        """Seek the chosen target, a new one is acquired when it dies, usually in batch by
+        retarget before the update.
+        Skipped steps turn the missile as much at once"""
 
-        if self._target and self._target.alive():
+        if self._target is None or not self._target.alive():
+            self._target = self.find_target()
+
+        if self._target:
             new_angle = math.degrees(math.atan2(self._position[1] - self._target._position[1],
                                      -self._position[0] + self._target._position[0]))
             angle = self._angle % 360
@@ -302,23 +323,38 @@ class Missile(game_object.Game_Object):
                 angle -= 360
             
             if - new_angle + angle <= 180 and - new_angle + angle >= 0:
-                self.spin(-self._spin)
+                self.spin(-self._spin * (self._lag + 1))
             else:
-                self.spin(self._spin) 
+                self.spin(self._spin * (self._lag + 1))
 
             self._speed = [self._missile_speed * math.cos(math.radians(self._angle)), 
                            self._missile_speed * -math.sin(math.radians(self._angle))]
 
     def update(self):
-        shine = game_object.Shine(self._game, [self.rect.centerx, self.rect.centery],
-                                  self._angle, image=self._game.lightred_shine)
-        self._game.environment.add(shine)
-        self._game.all.add(shine)
+        self._game.particles.emit([self.rect.centerx, self.rect.centery],
+                                  angle=self._angle, image=self._game.lightred_shine)
         self.seek()
-        if pygame.sprite.spritecollide(self, self._game.targets, False):
+        if self._game.colliding(self, self._game.target_grid.query_rect(self.rect)):
             self.explode()
-            for obj in self._game.targets.sprites():
-                if self.distance_from(obj._position) <= self._exp_radius:
-                    obj.hit(self._damage)
+            for obj in self._game.target_grid.query_radius(self._position, self._exp_radius):
+                obj.hit(self._damage)
         super().update()
 
+
+
+def retarget(game, sprites):
+    """Acquire new targets for the missiles among sprites whose target died, with a single
+    batched query of the target index instead of one query per missile.
+
+    Arguments:
+        game {object} -- game instance
+        sprites {list} -- sprites about to be updated"""
+
+    missiles = [sprite for sprite in sprites if isinstance(sprite, Missile) and
+                (sprite._target is None or not sprite._target.alive())]
+    if not missiles:
+        return
+    targets = game.target_index.nearest_many([missile._position for missile in missiles],
+                                             [missile._owner for missile in missiles])
+    for missile, target in zip(missiles, targets):
+        missile._target = target
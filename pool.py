@@ -0,0 +1,56 @@
+class Pool:
+    """Reusable game objects of a class.
+    Killed objects go back to the pool and the next acquire resets one of them instead of
+    building a new object, so steady fire does not allocate sprites, rects and lists.
+    Pooled classes implement reset, taking the constructor arguments but the game.
+
+    Arguments:
+        game {object} -- game instance
+        cls {class} -- pooled Game_Object class
+        capacity {int} -- max number of free objects kept"""
+
+    def __init__(self, game, cls, capacity=1024):
+        self._game = game
+        self._cls = cls
+        self._capacity = capacity
+        self._free = []
+        self.in_use = 0
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, *args, **kwargs):
+        """Free object reset with the arguments, a new one when the pool is empty
+
+        Returns:
+            object -- game object, not in any group"""
+
+        self.in_use += 1
+        if self._free:
+            self.hits += 1
+            instance = self._free.pop()
+            instance.reset(*args, **kwargs)
+            return instance
+        self.misses += 1
+        instance = self._cls(self._game, *args, **kwargs)
+        instance._pool = self
+        return instance
+
+    def release(self, instance):
+        """Take back a killed object, called by Game_Object.kill"""
+
+        self.in_use -= 1
+        if len(self._free) < self._capacity:
+            self._free.append(instance)
+
+    def stats(self):
+        """Pool counters
+
+        Returns:
+            dict -- in_use, free, hits, misses and hit_rate"""
+
+        acquires = self.hits + self.misses
+        return {"in_use": self.in_use,
+                "free": len(self._free),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / acquires if acquires else 0.0}
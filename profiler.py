@@ -0,0 +1,219 @@
+import collections
+import contextlib
+import cProfile
+import csv
+import json
+import time
+import pygame
+
+
+_NO_SCOPE = contextlib.nullcontext()
+
+# overlay colors of the phases, in order of appearance
+_COLORS = [(230, 25, 75), (60, 180, 75), (255, 225, 25), (0, 130, 200), (245, 130, 48),
+           (145, 30, 180), (70, 240, 240), (240, 50, 230), (210, 245, 60), (250, 190, 212),
+           (0, 128, 128), (220, 190, 255), (170, 110, 40), (255, 250, 200)]
+
+
+class _Scope:
+    """Adds the time spent in a with block to timings[name]"""
+
+    __slots__ = ("_timings", "_name", "_start")
+
+    def __init__(self, timings, name):
+        self._timings = timings
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self._timings[self._name] = (self._timings.get(self._name, 0.0) +
+                                     time.perf_counter() - self._start)
+
+
+class Profiler:
+    """Frame profiler with named timing scopes.
+    Every frame the time of each scope and of each entity class is stored in a ring buffer.
+    When disabled scopes are a shared null context and cost close to nothing.
+
+    Arguments:
+        frames {int} -- number of frames kept in the ring buffer"""
+
+    def __init__(self, frames=300):
+        self.enabled = False
+        self.overlay = False
+        self.frames = collections.deque(maxlen=frames)
+        self._phases = {} # name -> seconds, current frame
+        self._entities = {} # class name -> seconds, current frame
+        self._frame_start = 0.0
+        self._colors = {} # phase -> overlay color
+        self._capture = None # running cProfile
+        self._capture_frames = 0
+        self._capture_path = None
+
+    def scope(self, name):
+        """Timing scope, use as a with statement
+
+        Arguments:
+            name {str} -- scope name"""
+
+        if not self.enabled:
+            return _NO_SCOPE
+        return _Scope(self._phases, name)
+
+    def begin_frame(self):
+        """Start a new frame"""
+
+        self._phases = {}
+        self._entities = {}
+        self._frame_start = time.perf_counter()
+
+    def end_frame(self):
+        """Store the current frame in the ring buffer and advance a cProfile capture"""
+
+        if self.enabled:
+            self.frames.append({"time": time.perf_counter() - self._frame_start,
+                                "phases": self._phases,
+                                "entities": self._entities})
+        if self._capture is not None:
+            self._capture_frames -= 1
+            if self._capture_frames <= 0:
+                self.stop_capture()
+
+    def update_group(self, group, *args):
+        """Update group {object}, a group or a list of sprites, timing each entity class
+        when enabled"""
+
+        if not self.enabled:
+            for sprite in group:
+                sprite.update(*args)
+            return
+        entities = self._entities
+        for sprite in group:
+            start = time.perf_counter()
+            sprite.update(*args)
+            name = type(sprite).__name__ + ".update"
+            entities[name] = entities.get(name, 0.0) + time.perf_counter() - start
+
+    def draw_group(self, group, alpha):
+        """Draw group {object}, timing each entity class when enabled"""
+
+        if not self.enabled:
+            for sprite in group:
+                sprite.draw(alpha)
+            return
+        entities = self._entities
+        for sprite in group:
+            start = time.perf_counter()
+            sprite.draw(alpha)
+            name = type(sprite).__name__ + ".draw"
+            entities[name] = entities.get(name, 0.0) + time.perf_counter() - start
+
+    def last(self, count=None):
+        """Last count {int} frames of the ring buffer, all of them if None
+
+        Returns:
+            list -- frames, oldest first"""
+
+        frames = list(self.frames)
+        return frames if count is None else frames[-count:]
+
+    def export_json(self, path, count=None):
+        """Dump the last count {int} frames to path {str} as JSON, times in ms"""
+
+        frames = [{"time": frame["time"] * 1000,
+                   "phases": {name: value * 1000 for name, value in frame["phases"].items()},
+                   "entities": {name: value * 1000 for name, value in frame["entities"].items()}}
+                  for frame in self.last(count)]
+        with open(path, "w") as file:
+            json.dump({"unit": "ms", "frames": frames}, file, indent=1)
+
+    def export_csv(self, path, count=None):
+        """Dump the last count {int} frames to path {str} as CSV, one row per frame, times in ms"""
+
+        frames = self.last(count)
+        phases, entities = [], []
+        for frame in frames:
+            phases.extend(name for name in frame["phases"] if name not in phases)
+            entities.extend(name for name in frame["entities"] if name not in entities)
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["frame", "time"] + phases + entities)
+            for index, frame in enumerate(frames):
+                writer.writerow([index, "%.4f" % (frame["time"] * 1000)] +
+                                ["%.4f" % (frame["phases"].get(name, 0.0) * 1000) for name in phases] +
+                                ["%.4f" % (frame["entities"].get(name, 0.0) * 1000) for name in entities])
+
+    def dump(self, prefix="profile", count=None):
+        """Export the last count {int} frames to <prefix>.csv and <prefix>.json
+
+        Returns:
+            str -- prefix of the written files"""
+
+        self.export_csv(prefix + ".csv", count)
+        self.export_json(prefix + ".json", count)
+        return prefix
+
+    def start_capture(self, frames, path):
+        """Run cProfile for the next frames {int}, stats are written to path {str}"""
+
+        if self._capture is not None:
+            return
+        self._capture = cProfile.Profile()
+        self._capture_frames = frames
+        self._capture_path = path
+        self._capture.enable()
+
+    def stop_capture(self):
+        """Stop the running cProfile capture and write its stats"""
+
+        if self._capture is None:
+            return
+        self._capture.disable()
+        self._capture.dump_stats(self._capture_path)
+        self._capture = None
+
+    @property
+    def capturing(self):
+        return self._capture is not None
+
+    def draw_overlay(self, screen, font, height=120, budget=1 / 60):
+        """Stacked bar graph of the phases of the frames in the ring buffer.
+
+        Arguments:
+            screen {object} -- pygame surface
+            font {object} -- pygame font used by the legend
+            height {int} -- graph height in pixel
+            budget {float} -- frame budget in seconds, drawn as an horizontal line"""
+
+        frames = self.last(screen.get_width() // 2)
+        if not frames:
+            return
+        bottom = screen.get_height() - 5
+        scale = height / (2 * budget) # the graph shows two frame budgets
+
+        for index, frame in enumerate(frames):
+            x = index * 2
+            y = bottom
+            for name, value in frame["phases"].items():
+                color = self._colors.get(name)
+                if color is None:
+                    color = self._colors[name] = _COLORS[len(self._colors) % len(_COLORS)]
+                bar = max(1, int(value * scale))
+                pygame.draw.line(screen, color, (x, y), (x, y - bar), 2)
+                y -= bar
+        pygame.draw.line(screen, (255, 255, 255), (0, bottom - int(budget * scale)),
+                         (len(frames) * 2, bottom - int(budget * scale)))
+
+        # legend, with the average of the phases
+        averages = {}
+        for frame in frames:
+            for name, value in frame["phases"].items():
+                averages[name] = averages.get(name, 0.0) + value / len(frames)
+        y = bottom - height - 15 * len(averages)
+        for name, value in averages.items():
+            label = font.render("%s %.2f ms" % (name, value * 1000), 1,
+                                self._colors.get(name, (255, 255, 255)))
+            screen.blit(label, (5, y))
+            y += 15
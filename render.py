@@ -0,0 +1,216 @@
+import itertools
+import numpy
+import pygame
+
+
+class Renderer:
+    """Immediate renderer: every blit goes straight to the screen and the whole display
+    is updated at the end of the frame.
+
+    Arguments:
+        game {object} -- game instance"""
+
+    def __init__(self, game):
+        self._game = game
+
+    def begin(self):
+        """Start a new frame"""
+
+        self._game.screen.fill((0, 0, 0))
+
+    def blit(self, surface, position):
+        """Draw surface {object} at screen position {tuple: float}"""
+
+        self._game.screen.blit(surface, position)
+
+    def blits(self, sequence):
+        """Draw a sequence of (surface, position) with a single call"""
+
+        if hasattr(self._game.screen, "fblits"): # pygame-ce
+            self._game.screen.fblits(sequence)
+        else:
+            self._game.screen.blits(sequence, doreturn=False)
+
+    def draw_rect(self, color, rect, width=1):
+        """Draw the outline of rect {object} on screen"""
+
+        pygame.draw.rect(self._game.screen, color, rect, width)
+
+    def draw_sprites(self, sprites, alpha=1.0):
+        """Render pass of game objects. The camera transform and the screen culling of all
+        sprites are done at once, the images of the sprites in sight are rotated when needed,
+        sorted by layer and submitted with a single blits call. The object followed by the
+        camera is drawn at the screen center.
+
+        Arguments:
+            sprites {list: object} -- game objects, drawn by layer then in list order
+            alpha {float} -- interpolation between the last two simulation steps"""
+
+        if not sprites:
+            return
+        game = self._game
+        count = len(sprites)
+        rects = numpy.fromiter(itertools.chain.from_iterable(sprite.rect for sprite in sprites),
+                               numpy.int32, count * 4).reshape(-1, 4)
+        camera = numpy.array((game.camera_x, game.camera_y), float)
+        half_screen = numpy.array(game.screen_size, float) / 2
+
+        # sprites whose rect overlaps the screen, by layer
+        half = rects[:, 2:] / 2
+        visible = numpy.flatnonzero((numpy.abs(rects[:, :2] + half - camera) < half_screen + half).all(axis=1))
+        if not len(visible):
+            return
+        layers = numpy.fromiter((sprite._layer for sprite in sprites), numpy.int32, count)
+        visible = visible[numpy.argsort(layers[visible], kind="stable")]
+        sprites = [sprites[index] for index in visible.tolist()]
+        for sprite in sprites:
+            if sprite._need_update:
+                sprite.image_handler()
+                sprite._need_update = False
+
+        # screen position of the rotated images top left corner
+        count = len(sprites)
+        previous = numpy.fromiter(itertools.chain.from_iterable(sprite._previous_position for sprite in sprites),
+                                  float, count * 2).reshape(-1, 2)
+        position = numpy.fromiter(itertools.chain.from_iterable(sprite._position for sprite in sprites),
+                                  float, count * 2).reshape(-1, 2)
+        offset = numpy.fromiter(itertools.chain.from_iterable(sprite._draw_offset for sprite in sprites),
+                                float, count * 2).reshape(-1, 2)
+        origin = previous + (position - previous) * alpha + offset
+        screen_position = origin - camera + half_screen
+        images = [sprite.rotated_image for sprite in sprites]
+        target = game.camera_target
+        if target is not None and target._camera_mode == "scrolling" and target in sprites:
+            index = sprites.index(target)
+            screen_position[index] = half_screen - numpy.array(images[index].get_size()) / 2
+
+        screen_position = screen_position.astype(numpy.int32)
+        self.blits(zip(images, zip(screen_position[:, 0].tolist(), screen_position[:, 1].tolist())))
+
+        if game.debug:
+            labels = (rects[visible, :2] - camera + half_screen).tolist()
+            for sprite, label, sprite_origin in zip(sprites, labels, origin.tolist()):
+                if sprite._debuggable:
+                    sprite._label_position = label
+                    sprite._origin = sprite_origin
+                    sprite.display_label()
+                    sprite.display_rect()
+
+    def after(self, function):
+        """Run function(screen) once everything else is drawn, used by overlays"""
+
+        function(self._game.screen)
+
+    def present(self):
+        """Show the frame"""
+
+        pygame.display.update()
+
+
+class DirtyRectRenderer(Renderer):
+    """Renderer which only redraws and updates the screen areas changed since the last frame.
+    Draw calls are recorded, a call drawing the same surface at the same place as in the
+    last frame leaves its area untouched. The background is restored and the calls are
+    replayed only inside the changed areas, which are the only ones passed to
+    pygame.display.update. The whole screen is redrawn when the camera moves more than
+    camera_threshold pixels or when the changed area is too large.
+
+    Arguments:
+        game {object} -- game instance
+        max_ratio {float} -- changed screen fraction above which the whole screen is redrawn
+        camera_threshold {int} -- camera movement in pixel above which the whole screen is redrawn
+        max_rects {int} -- changed areas above which the whole screen is redrawn"""
+
+    def __init__(self, game, max_ratio=0.4, camera_threshold=0, max_rects=256):
+        super().__init__(game)
+        self._max_ratio = max_ratio
+        self._camera_threshold = camera_threshold
+        self._max_rects = max_rects
+        self._commands = [] # (surface or (color, width), screen rect)
+        self._overlays = []
+        self._previous = {} # draw call of the last frame -> screen rect
+        self._camera = None
+        self._full = True # next frame must be redrawn entirely
+        self.full_updates = 0
+        self.dirty_updates = 0
+
+    def begin(self):
+        self._commands = []
+        self._overlays = []
+
+    def blit(self, surface, position):
+        self._commands.append((surface, surface.get_rect(topleft=(int(position[0]),
+                                                                  int(position[1])))))
+
+    def blits(self, sequence):
+        for surface, position in sequence:
+            self.blit(surface, position)
+
+    def draw_rect(self, color, rect, width=1):
+        self._commands.append(((tuple(color), width), pygame.Rect(rect)))
+
+    def after(self, function):
+        self._overlays.append(function)
+
+    def _draw(self, command):
+        if isinstance(command[0], pygame.Surface):
+            self._game.screen.blit(command[0], command[1])
+        else:
+            pygame.draw.rect(self._game.screen, command[0][0], command[1], command[0][1])
+
+    def _changed_rects(self, current):
+        """Merged screen areas of the draw calls added or removed since the last frame"""
+
+        screen_rect = self._game.screen.get_rect()
+        rects = [rect.clip(screen_rect) for key, rect in self._previous.items() if key not in current]
+        rects.extend(rect.clip(screen_rect) for key, rect in current.items() if key not in self._previous)
+
+        # merge overlapping rects, merged rects never overlap
+        merged = []
+        for rect in rects:
+            if not rect.width or not rect.height:
+                continue
+            index = rect.collidelist(merged)
+            while index != -1:
+                rect = rect.union(merged.pop(index))
+                index = rect.collidelist(merged)
+            merged.append(rect)
+        return merged
+
+    def present(self):
+        screen = self._game.screen
+        current = {(command[0], tuple(command[1])): command[1] for command in self._commands}
+        camera = (self._game.camera_x, self._game.camera_y)
+
+        full = (self._full or self._overlays or
+                abs(camera[0] - self._camera[0]) > self._camera_threshold or
+                abs(camera[1] - self._camera[1]) > self._camera_threshold)
+        if not full:
+            dirty = self._changed_rects(current)
+            full = (len(dirty) > self._max_rects or
+                    sum(rect.width * rect.height for rect in dirty) >
+                    self._max_ratio * screen.get_width() * screen.get_height())
+
+        if full:
+            screen.fill((0, 0, 0))
+            for command in self._commands:
+                self._draw(command)
+            for function in self._overlays:
+                function(screen)
+            pygame.display.update()
+            self.full_updates += 1
+        elif dirty:
+            for rect in dirty:
+                screen.fill((0, 0, 0), rect)
+            for command in self._commands:
+                for index in command[1].collidelistall(dirty):
+                    screen.set_clip(dirty[index])
+                    self._draw(command)
+            screen.set_clip(None)
+            pygame.display.update(dirty)
+            self.dirty_updates += 1
+
+        self._previous = current
+        self._camera = camera
+        # overlays are not tracked, the frame after them is redrawn to erase them
+        self._full = bool(self._overlays)
@@ -0,0 +1,236 @@
+import struct
+import zlib
+import numpy
+import pygame
+
+
+# keys read by the simulation, bit i of a key mask is KEYS[i]
+KEYS = (pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT, pygame.K_q, pygame.K_e,
+        pygame.K_w, pygame.K_s, pygame.K_SPACE, pygame.K_LSHIFT, pygame.K_a)
+
+MAGIC = b"SREC"
+VERSION = 2
+# magic, version, seed, map size, screen size, ai ships, simulation rate, checksum interval,
+# flags, number of waves
+_HEADER = struct.Struct("<4sHQHHHHHHHHH")
+# scripted wave: tick, count, kind name length then the name
+_WAVE = struct.Struct("<IIB")
+
+# header flags, simulation settings besides the game constructor arguments
+PRECISE = 1 # pixel accurate collisions
+
+# body events: tag, ticks since the previous event (varint), payload
+_KEYS, _CHECKSUM, _END = range(3)
+
+
+def key_mask(keys):
+    """Bit mask of the KEYS pressed in keys {tuple}, as returned by pygame.key.get_pressed"""
+
+    mask = 0
+    for bit, key in enumerate(KEYS):
+        if keys[key]:
+            mask |= 1 << bit
+    return mask
+
+
+class MaskKeys:
+    """Pressed keys replacement of pygame.key.get_pressed, built from a key mask
+
+    Arguments:
+        mask {int} -- bit mask of the pressed KEYS"""
+
+    def __init__(self, mask):
+        self._pressed = frozenset(key for bit, key in enumerate(KEYS) if mask >> bit & 1)
+
+    def __getitem__(self, key):
+        return key in self._pressed
+
+
+def checksum(game):
+    """CRC32 of the simulation state: position, angle and life of every entity
+
+    Returns:
+        int -- state checksum"""
+
+    state = [len(game.entities), game.entities.count("all")]
+    for sprite in game.entities.members("all"):
+        life = sprite._life
+        state += [sprite._position[0], sprite._position[1], sprite._angle,
+                  -1.0 if life == "immortal" else life]
+    return zlib.crc32(numpy.array(state, numpy.float64).tobytes())
+
+
+def _varint(value):
+    data = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            data.append(byte | 0x80)
+        else:
+            data.append(byte)
+            return bytes(data)
+
+
+def _read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+class Recorder:
+    """Record the keys of every simulation step and periodic state checksums.
+    Only key changes are stored, as a tick delta and the new key mask. The header holds
+    the game settings which change the simulation: constructor arguments, collision mode
+    and scripted waves. Set as game.input, the game calls keys() before each step.
+
+    Arguments:
+        path {str} -- output file, written on close
+        game {object} -- game instance, in its initial state
+        seed {int} -- random seed the game was built with
+        ai_ships {int} -- fleet size the game was built with, its waves must be scheduled
+        checksum_interval {int} -- ticks between state checksums"""
+
+    def __init__(self, path, game, seed, ai_ships=0, checksum_interval=60):
+        self._path = path
+        self._game = game
+        self._checksum_interval = checksum_interval
+        waves = game.director.waves()
+        self._header = _HEADER.pack(MAGIC, VERSION, seed, game.map_size[0], game.map_size[1],
+                                    game.screen_size[0], game.screen_size[1], ai_ships,
+                                    game.sim_rate, checksum_interval,
+                                    PRECISE if game.precise_collisions else 0, len(waves))
+        for tick, name, count in waves:
+            name = name.encode("ascii")
+            self._header += _WAVE.pack(tick, count, len(name)) + name
+        self._body = bytearray()
+        self._tick = 0
+        self._last_event = 0 # tick of the last event
+        self._mask = None
+        self.finished = False
+
+    def _event(self, tag, payload=b""):
+        self._body.append(tag)
+        self._body += _varint(self._tick - self._last_event)
+        self._body += payload
+        self._last_event = self._tick
+
+    def keys(self, keys):
+        """Record the keys of the next step
+
+        Arguments:
+            keys {tuple} -- live pressed keys
+
+        Returns:
+            tuple -- keys, unchanged"""
+
+        if self._tick % self._checksum_interval == 0:
+            self._event(_CHECKSUM, struct.pack("<I", checksum(self._game)))
+        mask = key_mask(keys)
+        if mask != self._mask:
+            self._mask = mask
+            self._event(_KEYS, _varint(mask))
+        self._tick += 1
+        return keys
+
+    def close(self):
+        """Write the recording"""
+
+        self._event(_END)
+        with open(self._path, "wb") as file:
+            file.write(self._header + bytes(self._body))
+
+
+class Player:
+    """Replay a recording: keys of every step and checksum verification.
+    Set as game.input, the game reads the recorded keys and its live keys are ignored.
+    The game must be built with the recorded settings (seed, map_size, screen_size,
+    ai_ships) and given to attach before replaying, which sets the collision mode and
+    schedules the waves.
+
+    Arguments:
+        path {str} -- recording file"""
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            data = file.read()
+        (magic, version, self.seed, map_w, map_h, screen_w, screen_h, self.ai_ships,
+         self.sim_rate, self.checksum_interval, flags, waves) = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a version %d recording" % (path, VERSION))
+        self.map_size = (map_w, map_h)
+        self.screen_size = (screen_w, screen_h)
+        self.precise_collisions = bool(flags & PRECISE)
+
+        self.waves = [] # (tick, kind name, count)
+        offset = _HEADER.size
+        for x in range(waves):
+            tick, count, length = _WAVE.unpack_from(data, offset)
+            offset += _WAVE.size
+            self.waves.append((tick, data[offset:offset + length].decode("ascii"), count))
+            offset += length
+
+        self._changes = {} # tick -> key mask
+        self._checksums = {} # tick -> checksum
+        tick = 0
+        while True:
+            tag = data[offset]
+            delta, offset = _read_varint(data, offset + 1)
+            tick += delta
+            if tag == _KEYS:
+                self._changes[tick], offset = _read_varint(data, offset)
+            elif tag == _CHECKSUM:
+                self._checksums[tick] = struct.unpack_from("<I", data, offset)[0]
+                offset += 4
+            else:
+                break
+        self.ticks = tick
+
+        self.game = None
+        self._tick = 0
+        self._keys = MaskKeys(0)
+        self.mismatches = [] # ticks whose checksum differs from the recording
+        self.finished = self.ticks == 0
+
+    def attach(self, game):
+        """Replay into game {object}: set the recorded collision mode and waves"""
+
+        self.game = game
+        game.precise_collisions = self.precise_collisions
+        for tick, name, count in self.waves:
+            game.director.schedule(tick, name, count)
+
+    def keys(self, keys=None):
+        """Recorded keys of the next step, the game state is checked on checksum ticks
+
+        Arguments:
+            keys {tuple} -- live pressed keys, ignored
+
+        Returns:
+            object -- recorded pressed keys"""
+
+        expected = self._checksums.get(self._tick)
+        if expected is not None and checksum(self.game) != expected:
+            self.mismatches.append(self._tick)
+        mask = self._changes.get(self._tick)
+        if mask is not None:
+            self._keys = MaskKeys(mask)
+        self._tick += 1
+        self.finished = self._tick >= self.ticks
+        return self._keys
+
+    def run(self):
+        """Replay every step as fast as possible with rendering off, through game.simulate.
+        The player must be set as game.input.
+
+        Returns:
+            dict -- ticks, seconds, ticks_per_second, realtime and checksum mismatches"""
+
+        result = self.game.simulate(self.ticks - self._tick)
+        result["mismatches"] = self.mismatches
+        return result
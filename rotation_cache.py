@@ -0,0 +1,157 @@
+import collections
+import pygame
+
+
+class RotationCache:
+    """Rotated images shared by every game object.
+    Entries are keyed by source surface and angle bucket, source surfaces must not
+    be modified once they have been rotated.
+
+    Arguments:
+        resolution {float} -- size of the angle buckets in degrees
+        max_bytes {int} -- memory cap of the rotated surfaces, least recently used are dropped"""
+
+    def __init__(self, resolution=1.0, max_bytes=64 * 1024 * 1024):
+        self._entries = collections.OrderedDict() # (image, bucket) -> entry
+        self._bytes = 0
+        self.configure(resolution, max_bytes)
+
+    def configure(self, resolution=None, max_bytes=None):
+        """Change angular resolution and memory cap, the cache is emptied
+
+        Arguments:
+            resolution {float} -- size of the angle buckets in degrees
+            max_bytes {int} -- memory cap in bytes"""
+
+        if resolution is not None:
+            self.resolution = resolution
+            self._buckets = max(1, round(360 / resolution))
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        self.clear()
+
+    def clear(self):
+        """Drop every entry and reset the counters"""
+
+        self._entries.clear()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def bucket(self, angle):
+        """Angle bucket of angle {float} in degrees"""
+
+        return round((angle % 360) / self.resolution) % self._buckets
+
+    def rotate(self, image, angle):
+        """Rotated image and its placement attributes, as used by Game_Object.
+
+        Arguments:
+            image {object} -- source pygame surface
+            angle {float} -- angle in degrees
+
+        Returns:
+            tuple -- (rotated_image, min_box, max_box, pivot_move)"""
+
+        key = (image, self.bucket(angle))
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        entry = rotate(image, key[1] * self.resolution)
+        self._store(key, entry)
+        return entry
+
+    def preload(self, image, angle, rotated):
+        """Store an image rotated in advance, e.g. loaded from the asset cache.
+
+        Arguments:
+            image {object} -- source pygame surface
+            angle {float} -- rotation angle in degrees, it should be a bucket angle
+            rotated {object} -- image rotated by angle"""
+
+        key = (image, self.bucket(angle))
+        if key in self._entries:
+            return
+        self._store(key, (rotated,) + placement(image.get_size(), key[1] * self.resolution))
+
+    def _store(self, key, entry):
+        """Add entry and evict the least recently used ones above the memory cap"""
+
+        self._entries[key] = entry
+        self._bytes += _size_of(entry[0])
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            old = self._entries.popitem(last=False)[1]
+            self._bytes -= _size_of(old[0])
+            self.evictions += 1
+
+    def surfaces(self):
+        """Rotated surfaces held by the cache
+
+        Returns:
+            list -- pygame surfaces"""
+
+        return [entry[0] for entry in self._entries.values()]
+
+    def stats(self):
+        """Cache counters
+
+        Returns:
+            dict -- hits, misses, evictions, entries, bytes and hit_rate"""
+
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+def placement(size, angle):
+    """Bounding box and pivot translation of an image rotated by angle.
+
+    Arguments:
+        size {tuple: int} -- image size
+        angle {float} -- angle in degrees
+
+    Returns:
+        tuple -- (min_box, max_box, pivot_move)"""
+
+    box = [pygame.math.Vector2(p) for p in [(0, 0), (size[0], 0),
+           (size[0], -size[1]), (0, -size[1])]]
+    box_rotate = [p.rotate(angle) for p in box]
+    min_box = (min(box_rotate, key=lambda p: p[0])[0],
+               min(box_rotate, key=lambda p: p[1])[1])
+    max_box = (max(box_rotate, key=lambda p: p[0])[0],
+               max(box_rotate, key=lambda p: p[1])[1])
+
+    # calculate the translation of the pivot
+    pivot = pygame.math.Vector2(size[0] / 2, -size[1] / 2)
+    pivot_move = pivot.rotate(angle) - pivot
+    return min_box, max_box, pivot_move
+
+
+def rotate(image, angle):
+    """Rotate image and calculate its bounding box and pivot translation.
+
+    Arguments:
+        image {object} -- pygame surface
+        angle {float} -- angle in degrees
+
+    Returns:
+        tuple -- (rotated_image, min_box, max_box, pivot_move)"""
+
+    return (pygame.transform.rotate(image, angle),) + placement(image.get_size(), angle)
+
+
+def _size_of(surface):
+    return surface.get_bytesize() * surface.get_width() * surface.get_height()
+
+
+# process wide cache
+cache = RotationCache()
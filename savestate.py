@@ -0,0 +1,465 @@
+import gc
+import itertools
+import mmap
+import operator
+import os
+import random
+import struct
+import numpy
+import pygame
+import game_object
+import player_object
+
+
+MAGIC = b"SSAV"
+VERSION = 3
+
+# magic, version, map size, paused, entities, image names, tags, camera x, y
+_HEADER = struct.Struct("<4sHHHBIHHii")
+# spawn director: tick, next wave, kinds, queued spawns
+_DIRECTOR = struct.Struct("<IIHI")
+# random module state: gauss_next is set, gauss_next, then 625 words
+_RANDOM = struct.Struct("<Bd")
+_RANDOM_WORDS = 625
+_STRING = struct.Struct("<H")
+_COUNT = struct.Struct("<I")
+
+# entity kinds
+SHIP, SURFACE, EDGE, BULLET, MISSILE = range(5)
+
+# class of each kind, subclasses are not supported
+_CLASSES = {SHIP: player_object.Ship, SURFACE: game_object.Surface, EDGE: game_object.Edge,
+            BULLET: player_object.Bullet, MISSILE: player_object.Missile}
+_KINDS = {cls: kind for kind, cls in _CLASSES.items()}
+
+# entity flags
+_IMMORTAL, _CONTROLLED, _SCROLLING, _ALLY_TARGETS, _USER, _BASE, _KILLED = 1, 2, 4, 8, 16, 32, 64
+
+# one record per entity, image is an index in the asset names of the save,
+# owner and target are record indexes, lag the steps skipped by the level of detail.
+# params by kind:
+# ship: acceleration, h_acceleration, original spin, max speed, bullet speed, fire rate
+# bullet: bullet speed; missile: missile speed, explosion radius
+RECORD = numpy.dtype([("kind", "u1"), ("flags", "u1"), ("image", "<i2"),
+                      ("rect", "<i4", 4), ("position", "<f8", 2), ("previous", "<f8", 2),
+                      ("speed", "<f8", 2), ("angle", "<f8"), ("spin", "<f8"), ("life", "<f8"),
+                      ("damage", "<f8"), ("timer", "<f8"), ("params", "<f8", 6),
+                      ("owner", "<i4"), ("target", "<i4"), ("color", "u1", 4), ("lag", "u1")])
+
+
+class _NoCollection:
+    """Garbage collector off while thousands of objects are handled at once"""
+
+    def __enter__(self):
+        self._enabled = gc.isenabled()
+        gc.disable()
+
+    def __exit__(self, *exc):
+        if self._enabled:
+            gc.enable()
+
+
+def _strings(strings):
+    data = bytearray()
+    for string in strings:
+        encoded = string.encode()
+        data += _STRING.pack(len(encoded)) + encoded
+    return data
+
+
+def _read_strings(data, offset, count):
+    strings = []
+    for index in range(count):
+        length = _STRING.unpack_from(data, offset)[0]
+        offset += _STRING.size
+        strings.append(bytes(data[offset:offset + length]).decode())
+        offset += length
+    return strings, offset
+
+
+def _column(entities, attribute, dtype, size=1):
+    """Attribute of every entity as an array, sequences of size items are flattened"""
+
+    values = map(operator.attrgetter(attribute), entities)
+    if size > 1:
+        values = itertools.chain.from_iterable(values)
+    return numpy.fromiter(values, dtype, len(entities) * size).reshape(len(entities), size)
+
+
+def _records(game, entities, registered):
+    """Records of entities, every field is read from the objects and written as a column.
+    The entities after the first registered ones are killed
+
+    Returns:
+        tuple -- (records array, asset names of the images)"""
+
+    count = len(entities)
+    records = numpy.zeros(count, RECORD)
+    try:
+        records["kind"] = list(map(_KINDS.__getitem__, map(type, entities)))
+    except KeyError as error:
+        raise TypeError("%s entities can not be saved" % error.args[0].__name__)
+    kinds = records["kind"]
+    index = dict(zip(entities, range(count)))
+
+    def of_kind(*selected):
+        rows = numpy.flatnonzero(numpy.isin(kinds, selected))
+        return rows, [entities[row] for row in rows.tolist()]
+
+    records["rect"] = _column(entities, "rect", numpy.int32, 4)
+    records["position"] = _column(entities, "_position", numpy.float64, 2)
+    records["previous"] = _column(entities, "_previous_position", numpy.float64, 2)
+    records["speed"] = _column(entities, "_speed", numpy.float64, 2)
+    records["angle"] = _column(entities, "_angle", numpy.float64)[:, 0]
+    records["spin"] = _column(entities, "_spin", numpy.float64)[:, 0]
+    records["lag"] = _column(entities, "_lag", numpy.uint8)[:, 0]
+    lives = numpy.array(list(map(operator.attrgetter("_life"), entities)), object)
+    immortal = lives == "immortal"
+    lives[immortal] = 0.0
+    records["life"] = lives
+    modes = numpy.array(list(map(operator.attrgetter("_camera_mode"), entities)), object)
+    records["flags"] = (immortal.astype("u1") * _IMMORTAL |
+                        (modes == "scrolling").astype("u1") * _SCROLLING)
+    records["owner"] = records["target"] = -1
+
+    # images are stored as asset names, edges own their image
+    rows, objects = of_kind(SHIP, SURFACE, BULLET, MISSILE)
+    names = []
+    image_index = {}
+    images = [entity._image for entity in objects]
+    for entity, image in zip(objects, images):
+        if image not in image_index:
+            name = game.assets.name_of(image)
+            if name is None:
+                raise ValueError("%s image is not an asset" % type(entity).__name__)
+            image_index[image] = len(names)
+            names.append(name)
+    records["image"] = -1
+    records["image"][rows] = list(map(image_index.__getitem__, images))
+
+    rows, ships = of_kind(SHIP)
+    if ships:
+        records["params"][rows] = [(ship._acceleration, ship._h_acceleration, ship._original_spin,
+                                    ship._max_speed, ship._bullet_speed, ship._fire_rate)
+                                   for ship in ships]
+        records["timer"][rows] = [ship._bullet_timer for ship in ships]
+        records["flags"][rows] |= numpy.array([ship._controlled for ship in ships], "u1") * _CONTROLLED
+    rows, bullets = of_kind(BULLET)
+    if bullets:
+        records["params"][rows, 0] = [bullet._bullet_speed for bullet in bullets]
+        records["flags"][rows] |= (numpy.array([bullet._targets is game.allies for bullet in bullets],
+                                               "u1") * _ALLY_TARGETS)
+    rows, missiles = of_kind(MISSILE)
+    if missiles:
+        records["params"][rows, :2] = [(missile._missile_speed, missile._exp_radius)
+                                       for missile in missiles]
+        records["target"][rows] = [index.get(missile._target, -1) for missile in missiles]
+    rows, shots = of_kind(BULLET, MISSILE)
+    if shots:
+        records["owner"][rows] = [index.get(shot._owner, -1) for shot in shots]
+    rows, damaging = of_kind(SURFACE, EDGE, BULLET, MISSILE)
+    if damaging:
+        records["damage"][rows] = [entity._damage for entity in damaging]
+    rows, edges = of_kind(EDGE)
+    if edges:
+        records["color"][rows] = [tuple(edge._color) + (255,) * (4 - len(edge._color))
+                                  for edge in edges]
+
+    # roles are flags of their entity, killed ones are saved but not registered
+    for attribute, flag in (("user", _USER), ("base", _BASE)):
+        row = index.get(getattr(game, attribute, None), -1)
+        if row >= 0:
+            records["flags"][row] |= flag
+    records["flags"][registered:] |= _KILLED
+    return records, names
+
+
+def dumps(game):
+    """Serialize the state of a TestGame: every entity with its tags, the spawn director,
+    the camera and the random module state. Images are stored by asset name.
+    Particles are not saved, they are cosmetic and a restored game starts without them.
+
+    Arguments:
+        game {object} -- TestGame instance
+
+    Returns:
+        bytes -- save state"""
+
+    store = game.entities
+    entities = list(store)
+    # a killed user or base is still read by the simulation, e.g. for spawn positions
+    for attribute in ("user", "base"):
+        entity = getattr(game, attribute, None)
+        if entity is not None and entity._slot is None and entity not in entities[len(store):]:
+            entities.append(entity)
+    with _NoCollection():
+        records, names = _records(game, entities, len(store))
+        index = dict(zip(entities, range(len(entities))))
+        tags = store.tag_names()
+        tag_data = bytearray()
+        for tag in tags:
+            rows = numpy.fromiter(map(index.__getitem__, store.members(tag)), "<i4",
+                                  store.count(tag))
+            tag_data += _COUNT.pack(len(rows)) + rows.tobytes()
+
+    state = random.getstate()
+    gauss = state[2]
+    header = _HEADER.pack(MAGIC, VERSION, game.map_size[0], game.map_size[1], game.paused,
+                          len(entities), len(names), len(tags),
+                          int(game.camera_x), int(game.camera_y))
+    return b"".join((header,
+                     _RANDOM.pack(gauss is not None, gauss or 0.0),
+                     numpy.array(state[1], "<u4").tobytes(),
+                     _strings(names), _strings(tags), bytes(tag_data),
+                     _director(game), records.tobytes()))
+
+
+def _director(game):
+    """Spawn director section, kind timers and the queue by kind index"""
+
+    director = getattr(game, "director", None)
+    state = director.get_state() if director else {"tick": 0, "wave": 0, "timers": {}, "queue": []}
+    kinds = list(state["timers"])
+    return b"".join((_DIRECTOR.pack(state["tick"], state["wave"], len(kinds), len(state["queue"])),
+                     _strings(kinds),
+                     numpy.array([state["timers"][kind] for kind in kinds], "<f8").tobytes(),
+                     numpy.array([kinds.index(kind) for kind in state["queue"]], "<u2").tobytes()))
+
+
+def _read_director(data, offset):
+    """Spawn director state and the offset after its section"""
+
+    tick, wave, count, queued = _DIRECTOR.unpack_from(data, offset)
+    kinds, offset = _read_strings(data, offset + _DIRECTOR.size, count)
+    timers = numpy.frombuffer(data, "<f8", count, offset).tolist()
+    offset += count * 8
+    queue = numpy.frombuffer(data, "<u2", queued, offset).tolist()
+    offset += queued * 2
+    return {"tick": tick, "wave": wave, "timers": dict(zip(kinds, timers)),
+            "queue": [kinds[kind] for kind in queue]}, offset
+
+
+def save(game, path):
+    """Write the state of game {object} to path {str}, see dumps"""
+
+    data = dumps(game)
+    with open(path + ".tmp", "wb") as file:
+        file.write(data)
+    # replaced at once, a crash while saving keeps the previous save
+    os.replace(path + ".tmp", path)
+
+
+def _build(game, kind, image, position, size, color):
+    """New game object of kind through its constructor, or its pool for bullets and
+    missiles, _restore then overwrites the state saved in the record. Edges are built with
+    their image of size {tuple} filled with color"""
+
+    if kind == SHIP:
+        return player_object.Ship(game, image, position, 0, 0, 0, 0, 0, 0)
+    if kind == SURFACE:
+        return game_object.Surface(game, image, position)
+    if kind == EDGE:
+        return game_object.Edge(game, position, size, color)
+    if kind == BULLET:
+        return game.bullet_pool.acquire(image, position, 0, 0, None)
+    return game.missile_pool.acquire(image, position, 0, None)
+
+
+def _reset(entity, kind, image, position):
+    """Reuse a current game object of kind through its reset, as its pool would"""
+
+    if kind == BULLET:
+        entity.reset(image, position, 0, 0, None)
+    elif kind == MISSILE:
+        entity.reset(image, position, 0, None)
+    else:
+        entity.reset_object(position, image)
+
+
+def _restore(game, records, images, spare):
+    """Game objects of the records, with their references to each other.
+    Objects of spare are reused first through their reset, the missing ones are built by
+    their constructors, so every attribute they set exists. The saved state is then
+    written in one pass over the objects for the fields of every kind, then one pass per
+    kind. Images are rotated when drawn, as _need_update is set.
+
+    Arguments:
+        game {object} -- game instance
+        records {array} -- RECORD array
+        images {list: object} -- surfaces of the asset names of the save
+        spare {dict} -- class -> reusable objects, not registered
+
+    Returns:
+        list -- game objects, not registered"""
+
+    kinds = records["kind"]
+    surfaces = numpy.array(images + [None], object)[records["image"]]
+    entities = []
+    for row, kind, image, position in zip(range(len(records)), kinds.tolist(), surfaces.tolist(),
+                                          records["position"].tolist()):
+        reusable = spare.get(_CLASSES[kind])
+        size = color = None
+        if kind == EDGE:
+            # edges own their image, only an edge of the same size and color is reused
+            record = records[row]
+            size, color = tuple(record["rect"][2:].tolist()), tuple(record["color"].tolist())
+            reusable = [edge for edge in reusable or () if edge._image.get_size() == size and
+                        tuple(edge._color) + (255,) * (4 - len(edge._color)) == color][:1]
+            if reusable:
+                spare[game_object.Edge].remove(reusable[0])
+                image = reusable[0]._image
+            position = record["rect"][:2].tolist()
+        if reusable:
+            entity = reusable.pop()
+            _reset(entity, kind, image, position)
+        else:
+            entity = _build(game, kind, image, position, size, color)
+        entities.append(entity)
+
+    def of_kind(*selected):
+        rows = numpy.flatnonzero(numpy.isin(kinds, selected))
+        return records[rows], [entities[row] for row in rows.tolist()]
+
+    def references(indexes):
+        return [entities[index] if index >= 0 else None for index in indexes.tolist()]
+
+    # fields of every kind, see Game_Object.reset_object. Edges keep their own image
+    flags = records["flags"]
+    lives = records["life"].astype(object)
+    lives[(flags & _IMMORTAL) != 0] = "immortal"
+    modes = numpy.where(flags & _SCROLLING, "scrolling", "normal").tolist()
+    sizes = numpy.array([image.get_size() for image in images] + [None], object)[records["image"]]
+    damages = records["damage"].astype(object)
+    damages[kinds == SHIP] = None
+    for (entity, rect, position, previous, speed, angle, spin, lag, life, mode, need_update,
+         image, size, damage) in zip(entities, records["rect"].tolist(),
+                                     records["position"].tolist(),
+                                     map(tuple, records["previous"].tolist()),
+                                     records["speed"].tolist(), records["angle"].tolist(),
+                                     records["spin"].tolist(), records["lag"].tolist(),
+                                     lives.tolist(), modes, (kinds != EDGE).tolist(),
+                                     surfaces.tolist(), sizes.tolist(), damages.tolist()):
+        entity.rect = pygame.Rect(rect)
+        entity._position = entity._origin = entity._label_position = position
+        entity._previous_position = previous
+        entity._speed = speed
+        entity._angle = angle
+        entity._spin = spin
+        entity._lag = lag
+        entity._life = life
+        entity._camera_mode = mode
+        entity._label_lines = None
+        entity._need_update = need_update
+        if image is not None:
+            entity._image = image
+            entity._size = size
+        if damage is not None:
+            entity._damage = damage
+
+    selected, ships = of_kind(SHIP)
+    for ship, params, timer, controlled in zip(ships, selected["params"].tolist(),
+                                               selected["timer"].tolist(),
+                                               (selected["flags"] & _CONTROLLED).tolist()):
+        (ship._acceleration, ship._h_acceleration, ship._original_spin,
+         ship._max_speed, ship._bullet_speed, ship._fire_rate) = params
+        ship._bullet_timer = timer
+        ship._controlled = bool(controlled)
+    selected, bullets = of_kind(BULLET)
+    for bullet, speed, owner, allies in zip(bullets, selected["params"][:, 0].tolist(),
+                                            references(selected["owner"]),
+                                            (selected["flags"] & _ALLY_TARGETS).tolist()):
+        bullet._bullet_speed = speed
+        bullet._owner = owner
+        bullet._targets = game.allies if allies else None
+    selected, missiles = of_kind(MISSILE)
+    for missile, (speed, radius), owner, target in zip(missiles,
+                                                        selected["params"][:, :2].tolist(),
+                                                        references(selected["owner"]),
+                                                        references(selected["target"])):
+        missile._missile_speed = speed
+        missile._exp_radius = radius
+        missile._owner = owner
+        missile._target = target
+    return entities
+
+
+def loads(game, data):
+    """Restore a save state in game. Every entity of the game is replaced: current objects
+    of the same class are reused and only the missing ones are built. Groups keep the
+    saved order and the fleet takes back its ships.
+
+    Arguments:
+        game {object} -- TestGame instance, with the map size of the save
+        data {object} -- save state, bytes or any buffer such as a memory map"""
+
+    (magic, version, map_w, map_h, paused, count, name_count, tag_count,
+     camera_x, camera_y) = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a save state")
+    if version != VERSION:
+        raise ValueError("save state version %d, version %d expected" % (version, VERSION))
+    if (map_w, map_h) != tuple(game.map_size):
+        raise ValueError("save state of a %dx%d map" % (map_w, map_h))
+
+    offset = _HEADER.size
+    has_gauss, gauss = _RANDOM.unpack_from(data, offset)
+    offset += _RANDOM.size
+    words = numpy.frombuffer(data, "<u4", _RANDOM_WORDS, offset).tolist()
+    offset += _RANDOM_WORDS * 4
+    names, offset = _read_strings(data, offset, name_count)
+    tags, offset = _read_strings(data, offset, tag_count)
+    members = []
+    for tag in tags:
+        size = _COUNT.unpack_from(data, offset)[0]
+        offset += _COUNT.size
+        members.append(numpy.frombuffer(data, "<i4", size, offset))
+        offset += size * 4
+    director, offset = _read_director(data, offset)
+    # records are copied out of the buffer, so a memory map can be closed afterwards
+    records = numpy.frombuffer(data, RECORD, count, offset).copy()
+    random.setstate((3, tuple(words), gauss if has_gauss else None))
+
+    with _NoCollection():
+        store = game.entities
+        spare = {}
+        for entity in store:
+            spare.setdefault(type(entity), []).append(entity)
+        store.clear()
+        game.particles.clear()
+        # missiles look for a target when reset, there are none until the end of the load
+        game.target_index.invalidate()
+
+        entities = numpy.empty(count, object)
+        entities[:] = _restore(game, records, [game.assets.load(name) for name in names], spare)
+        # entities get their saved slots back and tags their saved member order
+        store.extend(entities[(records["flags"] & _KILLED) == 0].tolist(),
+                     {tag: entities[rows].tolist() for tag, rows in zip(tags, members)})
+        # leftovers are dropped, pooled ones go back to their pool
+        for leftovers in spare.values():
+            for entity in leftovers:
+                if entity._pool is not None:
+                    entity._pool.release(entity)
+
+    flags = records["flags"]
+    game.camera_target = None
+    for flag, role in ((_USER, "user"), (_BASE, "base"), (_SCROLLING, "camera_target")):
+        for entity in entities[(flags & flag) != 0].tolist():
+            setattr(game, role, entity)
+    game.camera_x, game.camera_y = camera_x, camera_y
+    game.paused = bool(paused)
+    if getattr(game, "director", None) is not None:
+        game.director.set_state(director)
+    fleet = getattr(game, "fleet", None)
+    if fleet is not None:
+        fleet.clear()
+        fleet._center = game.base
+        fleet.add(*store.members("fleet"))
+    game.target_index.invalidate()
+
+
+def load(game, path):
+    """Restore the save state at path {str} in game {object}, the file is memory mapped"""
+
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            loads(game, data)
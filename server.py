@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import collections
+import os
+import random
+import time
+import numpy
+import pygame
+import game_mode
+import netcode
+import particles
+import player_object
+import replay
+
+
+class _Client:
+    """Server side state of a connected client"""
+
+    def __init__(self, client_id, address, screen_size, ship):
+        self.id = client_id
+        self.address = address
+        self.screen_size = screen_size
+        self.ship = ship
+        self.inputs = collections.deque() # (sequence, key mask) to apply, oldest first
+        self.input_sequence = 0 # newest input received
+        self.processed = 0 # last input applied
+        self.keys = replay.MaskKeys(0)
+        self.snapshots = {} # sequence -> state sent, until acknowledged
+        self.sequence = 0
+        self.acked = 0
+        self.last_seen = time.perf_counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+class Server(asyncio.DatagramProtocol):
+    """Authoritative game server over UDP.
+    The server runs the TestGame simulation, clients send their keys and receive snapshots
+    of the entities around their ship, delta encoded against the last snapshot they
+    acknowledged. Every client drives its own ship.
+
+    Arguments:
+        game {object} -- TestGame instance, its user ship is removed
+        seed {int} -- random seed the game was built with, clients use it for the sky
+        snapshot_interval {int} -- ticks between two snapshots
+        timeout {float} -- seconds of silence before a client is dropped"""
+
+    def __init__(self, game, seed, snapshot_interval=2, timeout=5.0):
+        self._game = game
+        self._seed = seed
+        self._snapshot_interval = snapshot_interval
+        self._timeout = timeout
+        self._transport = None
+        self._clients = {} # address -> client
+        self._next_id = 1
+        self._kinds = {game.assets.load(name): kind for kind, name in enumerate(netcode.KINDS)}
+        self.tick_count = 0
+        self.tick_times = collections.deque(maxlen=600)
+        self._stats_time = time.perf_counter()
+        game.user.kill() # no local player
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def datagram_received(self, data, address):
+        if not data:
+            return
+        client = self._clients.get(address)
+        if data[0] == netcode.HELLO:
+            protocol, screen_size = netcode.decode_hello(data)
+            if protocol != netcode.PROTOCOL:
+                return
+            if client is None:
+                client = self._clients[address] = _Client(self._next_id, address, screen_size,
+                                                          self._spawn_ship())
+                self._next_id += 1
+            self._send(client, netcode.encode_welcome(client.id, self._ship_id(client.ship),
+                                                      self._game.map_size, self._game.sim_rate,
+                                                      self._snapshot_interval, self._seed))
+        elif client is None:
+            return
+        elif data[0] == netcode.INPUT:
+            client.last_seen = time.perf_counter()
+            client.bytes_received += len(data)
+            sequence, ack, masks = netcode.decode_input(data)
+            new = [(sequence - index, mask) for index, mask in enumerate(masks)
+                   if sequence - index > client.input_sequence]
+            client.inputs.extend(reversed(new))
+            client.input_sequence = max(client.input_sequence, sequence)
+            if ack in client.snapshots and ack > client.acked:
+                client.acked = ack
+                for old in [old for old in client.snapshots if old < ack]:
+                    del client.snapshots[old]
+        elif data[0] == netcode.BYE:
+            self._drop(client)
+
+    def _send(self, client, data):
+        client.bytes_sent += len(data)
+        self._transport.sendto(data, client.address)
+
+    def _drop(self, client):
+        client.ship.kill()
+        del self._clients[client.address]
+
+    def _ship_id(self, ship):
+        return netcode.entity_id(self._game.entities.handle(ship))
+
+    def _spawn_ship(self):
+        """New player ship at a random position away from the base"""
+
+        game = self._game
+        position = [random.randint(200, game.map_size[0] - 200),
+                    random.randint(200, game.map_size[1] - 200)]
+        while game.base.distance_from(position) < 400:
+            position = [random.randint(200, game.map_size[0] - 200),
+                        random.randint(200, game.map_size[1] - 200)]
+        ship = player_object.Ship(game, game.assets.load("ship.png"), position,
+                                  controlled=True, need_max_rect=False, **netcode.SHIP)
+        game.spawn(ship, "remote", "allies", "all")
+        return ship
+
+    def tick(self):
+        """One simulation step with the clients keys, snapshots every snapshot_interval"""
+
+        start = time.perf_counter()
+        game = self._game
+        for client in list(self._clients.values()):
+            if start - client.last_seen > self._timeout:
+                self._drop(client)
+                continue
+            if client.inputs:
+                # a late client may catch up, the backlog is kept short
+                while len(client.inputs) > netcode.INPUT_REDUNDANCY:
+                    client.inputs.popleft()
+                client.processed, mask = client.inputs.popleft()
+                client.keys = replay.MaskKeys(mask & ~(1 << replay.KEYS.index(pygame.K_a)))
+
+        game.step(replay.MaskKeys(0))
+        for client in self._clients.values():
+            if client.ship.alive():
+                client.ship.update(client.keys)
+            if not client.ship.alive():
+                client.ship = self._spawn_ship()
+
+        self.tick_count += 1
+        if self.tick_count % self._snapshot_interval == 0 and self._clients:
+            self._snapshots()
+        self.tick_times.append(time.perf_counter() - start)
+
+    def _snapshots(self):
+        """Send every client the entities around its ship"""
+
+        entities = [entity for entity in self._game.entities if entity._image in self._kinds]
+        if not entities:
+            return
+        positions = numpy.array([entity._position for entity in entities], numpy.float64)
+        ids = [netcode.entity_id(self._game.entities.handle(entity)) for entity in entities]
+        states = [netcode.quantize(self._kinds[entity._image], entity._position, entity._angle)
+                  for entity in entities]
+
+        for client in self._clients.values():
+            ship = client.ship
+            offset = numpy.abs(positions - ship._position)
+            in_view = numpy.flatnonzero(
+                (offset[:, 0] < client.screen_size[0] / 2 + netcode.VIEW_MARGIN) &
+                (offset[:, 1] < client.screen_size[1] / 2 + netcode.VIEW_MARGIN))
+            in_view = in_view[numpy.argsort((offset[in_view] ** 2).sum(axis=1))]
+            ship_id = self._ship_id(ship)
+            visible = [(ids[index], states[index]) for index in in_view.tolist()
+                       if ids[index] != ship_id]
+
+            client.sequence += 1
+            baseline = client.snapshots.get(client.acked, {})
+            life = ship._life if ship._life != "immortal" else -1
+            header = (client.sequence, client.acked if baseline else 0, self.tick_count,
+                      client.processed, ship_id, ship._position[0], ship._position[1],
+                      ship._speed[0], ship._speed[1], ship._angle, max(-1, min(int(life), 32767)))
+            data, client.snapshots[client.sequence] = netcode.encode_snapshot(header, baseline, visible)
+            # unacknowledged snapshots are kept for a while, then the client gets full ones
+            if len(client.snapshots) > 64:
+                del client.snapshots[min(client.snapshots)]
+            self._send(client, data)
+
+    def stats(self):
+        """Server counters since the previous call
+
+        Returns:
+            dict -- clients, tick time percentiles in ms and bytes per client per second"""
+
+        now = time.perf_counter()
+        seconds = now - self._stats_time
+        self._stats_time = now
+        clients = list(self._clients.values())
+        sent = sum(client.bytes_sent for client in clients)
+        received = sum(client.bytes_received for client in clients)
+        for client in clients:
+            client.bytes_sent = client.bytes_received = 0
+        times = numpy.array(self.tick_times or [0.0]) * 1000
+        return {"clients": len(clients),
+                "entities": len(self._game.entities),
+                "tick_ms": {"mean": float(times.mean()),
+                            "p99": float(numpy.percentile(times, 99)),
+                            "max": float(times.max())},
+                "down_bytes_per_client_s": sent / len(clients) / seconds if clients else 0.0,
+                "up_bytes_per_client_s": received / len(clients) / seconds if clients else 0.0}
+
+    async def run(self, duration=None):
+        """Fixed step simulation loop
+
+        Arguments:
+            duration {float} -- seconds to run, forever if None"""
+
+        loop = asyncio.get_running_loop()
+        step_time = 1 / self._game.sim_rate
+        next_time = start = loop.time()
+        while duration is None or loop.time() - start < duration:
+            self.tick()
+            next_time += step_time
+            delay = next_time - loop.time()
+            if delay < -0.25:
+                # too late, the backlog is dropped
+                next_time = loop.time()
+            await asyncio.sleep(max(0.0, delay))
+
+
+async def serve(host, port, game, seed, duration=None, report=5.0):
+    """Run a server until duration {float} seconds, reporting its stats every report seconds
+
+    Returns:
+        object -- the server"""
+
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(lambda: Server(game, seed),
+                                                            local_addr=(host, port))
+
+    async def reporter():
+        while True:
+            await asyncio.sleep(report)
+            stats = server.stats()
+            print("%(clients)d clients, %(entities)d entities, " % stats +
+                  "tick %(mean).2f ms (p99 %(p99).2f ms), " % stats["tick_ms"] +
+                  "%(down_bytes_per_client_s).0f B/s down %(up_bytes_per_client_s).0f B/s up per client" % stats)
+
+    reporting = asyncio.ensure_future(reporter()) if report else None
+    try:
+        await server.run(duration)
+    finally:
+        if reporting:
+            reporting.cancel()
+        transport.close()
+    return server
+
+
+def create_game(seed, ai_ships=0, map_size=(2500, 2500)):
+    """Server game, built headless with seed {int}"""
+
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pygame.init()
+    random.seed(seed)
+    game = game_mode.TestGame(map_size, (320, 200), False, ai_ships)
+    game.particles = particles.ParticleSystem(game, capacity=0) # nobody sees them
+    game.lod.enabled = False # clients look around their own ship, not the server camera
+    return game
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shooter server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--ai", type=int, default=0, metavar="SHIPS",
+                        help="number of enemy ships driven by the fleet AI")
+    parser.add_argument("--seed", type=int, help="random seed, random if missing")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.getrandbits(32)
+    try:
+        asyncio.run(serve(args.host, args.port, create_game(seed, args.ai), seed))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,115 @@
+import math
+
+
+class SpatialHash:
+    """Uniform grid over the map used as collision broadphase.
+    The grid is rebuilt once per tick from the sprites rect, queries only look at the
+    cells they cover so their cost depends on local density instead of sprites count.
+
+    Arguments:
+        cell_size {int} -- side of a grid cell in pixel"""
+
+    def __init__(self, cell_size=128):
+        self._cell_size = cell_size
+        self._cells = {} # (column, row) -> list of sprites
+
+    def __len__(self):
+        return len(self._cells)
+
+    def _span(self, left, top, right, bottom):
+        """Cells covered by the box, right and bottom excluded"""
+
+        size = self._cell_size
+        for column in range(int(left // size), int((right - 1) // size) + 1):
+            for row in range(int(top // size), int((bottom - 1) // size) + 1):
+                yield (column, row)
+
+    def rebuild(self, sprites):
+        """Insert sprites {iterable} in an empty grid according to their rect"""
+
+        self._cells = cells = {}
+        size = self._cell_size
+        for sprite in sprites:
+            left, top, width, height = sprite.rect
+            # same cells as _span, inlined since it runs for every sprite every tick
+            for column in range(left // size, (left + width - 1) // size + 1):
+                for row in range(top // size, (top + height - 1) // size + 1):
+                    bucket = cells.get((column, row))
+                    if bucket is None:
+                        cells[(column, row)] = [sprite]
+                    else:
+                        bucket.append(sprite)
+
+    def _candidates(self, cells):
+        """Alive sprites in cells, each returned once"""
+
+        seen = set()
+        for cell in cells:
+            for sprite in self._cells.get(cell, ()):
+                if sprite not in seen:
+                    seen.add(sprite)
+                    if sprite.alive():
+                        yield sprite
+
+    def query_rect(self, rect):
+        """Sprites whose rect overlaps rect {object} pygame rect
+
+        Returns:
+            list -- colliding sprites"""
+
+        return [sprite for sprite in
+                self._candidates(self._span(rect.left, rect.top, rect.right, rect.bottom))
+                if rect.colliderect(sprite.rect)]
+
+    def query_radius(self, point, radius):
+        """Sprites whose _position is within radius {float} from point {tuple: float}
+
+        Returns:
+            list -- sprites in radius"""
+
+        square = radius ** 2
+        return [sprite for sprite in
+                self._candidates(self._span(point[0] - radius, point[1] - radius,
+                                            point[0] + radius + 1, point[1] + radius + 1))
+                if ((sprite._position[0] - point[0]) ** 2 +
+                    (sprite._position[1] - point[1]) ** 2) <= square]
+
+    def query_segment(self, start, end):
+        """Sprites whose rect is crossed by the segment from start to end {tuple: float}
+
+        Returns:
+            list -- sprites crossed by the segment, in grid traversal order"""
+
+        return [sprite for sprite in self._candidates(self._traverse(start, end))
+                if sprite.rect.clipline(start, end)]
+
+    def _traverse(self, start, end):
+        """Cells crossed by a segment, grid traversal by Amanatides and Woo"""
+
+        size = self._cell_size
+        column, row = int(start[0] // size), int(start[1] // size)
+        last_column, last_row = int(end[0] // size), int(end[1] // size)
+        dx, dy = end[0] - start[0], end[1] - start[1]
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        # distance along the segment, as a fraction of it, to the next cell border
+        if dx:
+            border = (column + (step_x > 0)) * size
+            t_max_x, t_delta_x = (border - start[0]) / dx, size / abs(dx)
+        else:
+            t_max_x = t_delta_x = math.inf
+        if dy:
+            border = (row + (step_y > 0)) * size
+            t_max_y, t_delta_y = (border - start[1]) / dy, size / abs(dy)
+        else:
+            t_max_y = t_delta_y = math.inf
+
+        yield (column, row)
+        while (column, row) != (last_column, last_row) and min(t_max_x, t_max_y) <= 1:
+            if t_max_x < t_max_y:
+                column += step_x
+                t_max_x += t_delta_x
+            else:
+                row += step_y
+                t_max_y += t_delta_y
+            yield (column, row)
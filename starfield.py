@@ -0,0 +1,82 @@
+import collections
+import numpy
+import pygame
+
+
+class Starfield(pygame.sprite.Sprite):
+    """Starry sky made of fixed size tiles, generated on demand from a per tile seed.
+    Generated tiles are kept in a LRU cache and only the tiles in sight are drawn, so memory
+    and startup cost do not depend on the map size.
+    The map layer (parallax 1.0) only covers the map, slower parallax layers repeat forever
+    behind it.
+
+    Arguments:
+        game {object} -- game instance
+        seed {int} -- starfield seed, same seed same sky
+        layers {list: tuple} -- (parallax, stars per pixel, brightness) of each layer,
+                                drawn in order
+        tile_size {int} -- tile side in pixel
+        cache_size {int} -- max number of generated tiles kept in memory"""
+
+    def __init__(self, game, seed, layers=((1.0, 1000 / 2500 ** 2, 255),),
+                 tile_size=256, cache_size=128):
+        super().__init__()
+        self._game = game
+        self._seed = seed
+        self._layers = layers
+        self._tile_size = tile_size
+        self._cache_size = cache_size
+        self._tiles = collections.OrderedDict() # (layer, column, row) -> surface
+        self.rect = pygame.Rect((0, 0), game.map_size)
+
+    def _tile(self, layer, column, row):
+        """Tile surface, generated when missing from the cache"""
+
+        key = (layer, column, row)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            return tile
+
+        parallax, density, brightness = self._layers[layer]
+        width = height = self._tile_size
+        if parallax == 1.0:
+            # map tiles are cut at the map edges
+            width = min(width, self._game.map_size[0] - column * self._tile_size)
+            height = min(height, self._game.map_size[1] - row * self._tile_size)
+
+        rng = numpy.random.default_rng([self._seed, layer,
+                                        column & 0xffffffff, row & 0xffffffff])
+        pixels = numpy.zeros((width, height, 3), numpy.uint8)
+        stars = rng.poisson(density * width * height)
+        pixels[rng.integers(0, width, stars), rng.integers(0, height, stars)] = brightness
+
+        tile = pygame.surfarray.make_surface(pixels).convert()
+        tile.set_colorkey((0, 0, 0))
+        self._tiles[key] = tile
+        if len(self._tiles) > self._cache_size:
+            self._tiles.popitem(last=False)
+        return tile
+
+    def draw(self, alpha=1.0):
+        """Blit the tiles in sight of every layer"""
+
+        size = self._tile_size
+        screen_w, screen_h = self._game.screen_size
+        blits = []
+        for layer, (parallax, density, brightness) in enumerate(self._layers):
+            # world position of the screen top left corner in this layer
+            left = self._game.camera_x * parallax - screen_w / 2
+            top = self._game.camera_y * parallax - screen_h / 2
+            first_column, last_column = int(left // size), int((left + screen_w) // size)
+            first_row, last_row = int(top // size), int((top + screen_h) // size)
+            if parallax == 1.0:
+                first_column, first_row = max(first_column, 0), max(first_row, 0)
+                last_column = min(last_column, (self._game.map_size[0] - 1) // size)
+                last_row = min(last_row, (self._game.map_size[1] - 1) // size)
+
+            for column in range(first_column, last_column + 1):
+                for row in range(first_row, last_row + 1):
+                    blits.append((self._tile(layer, column, row),
+                                  (int(column * size - left), int(row * size - top))))
+        self._game.renderer.blits(blits)
@@ -0,0 +1,173 @@
+import itertools
+import numpy
+
+
+# point target pairs below which a batch query computes every distance at once, 1 MB of
+# temporaries, instead of searching the grid
+MATRIX_PAIRS = 1 << 16
+
+
+class TargetIndex:
+    """Target acquisition over a sprite group.
+    Targets positions are copied in a numpy array once per tick, on first query after
+    invalidate(). Targets killed after the build are skipped by every query.
+    Batch queries search a uniform grid of the copied positions, built on their first call.
+
+    Arguments:
+        group {object} -- pygame group of the targets
+        cell_size {int} -- side of the grid cells in pixels"""
+
+    def __init__(self, group, cell_size=256):
+        self._group = group
+        self._cell_size = cell_size
+        self._targets = []
+        self._indexes = {} # target -> row in self._positions
+        self._positions = numpy.empty((0, 2))
+        self._cells = None # (column, row) -> rows of the targets in the cell, increasing
+        self._bounds = None # first and last (column, row) holding targets
+        self._stale = True
+
+    def invalidate(self):
+        """Rebuild the index on next query, called once per tick"""
+
+        self._stale = True
+
+    def _build(self):
+        self._targets = self._group.sprites()
+        self._indexes = {target: index for index, target in enumerate(self._targets)}
+        self._positions = numpy.array([target._position for target in self._targets],
+                                      numpy.float64).reshape(-1, 2)
+        self._cells = None
+        self._stale = False
+
+    def _build_grid(self):
+        cells = numpy.floor(self._positions / self._cell_size).astype(numpy.int64)
+        # stable sort, rows stay increasing inside a cell
+        order = numpy.lexsort((cells[:, 1], cells[:, 0]))
+        keys, starts = numpy.unique(cells[order], axis=0, return_index=True)
+        self._cells = {tuple(key): rows for key, rows in
+                       zip(keys.tolist(), numpy.split(order, starts[1:]))}
+        self._bounds = cells.min(axis=0).tolist(), cells.max(axis=0).tolist()
+
+    def _grid_nearest(self, point, exclude):
+        """Closest alive target but exclude, searched in a window of cells around the cell of
+        point, doubled until the best target found is closer than any target outside of it.
+        Ties go to the first row, as in nearest"""
+
+        size = self._cell_size
+        column, row = int(point[0] // size), int(point[1] // size)
+        (first_column, first_row), (last_column, last_row) = self._bounds
+        # window covering every target
+        full = max(column - first_column, last_column - column, row - first_row, last_row - row)
+        radius = 1
+        while True:
+            rows = [self._cells[cell] for cell in
+                    itertools.product(range(column - radius, column + radius + 1),
+                                      range(row - radius, row + radius + 1))
+                    if cell in self._cells]
+            best = None
+            if rows:
+                candidates = numpy.concatenate(rows)
+                distances = ((self._positions[candidates] - point) ** 2).sum(axis=1)
+                for index in numpy.lexsort((candidates, distances)).tolist():
+                    target = self._targets[candidates[index]]
+                    if target is not exclude and target.alive():
+                        best, best_distance = target, distances[index]
+                        break
+            # targets out of the window are at least radius cells away
+            if radius >= full or (best is not None and best_distance < (radius * size) ** 2):
+                return best
+            radius *= 2
+
+    def _distances(self, point, exclude):
+        """Squared distances from point, excluded targets are infinitely far"""
+
+        if self._stale:
+            self._build()
+        distances = ((self._positions - point) ** 2).sum(axis=1)
+        if exclude is not None:
+            index = self._indexes.get(exclude)
+            if index is not None:
+                distances[index] = numpy.inf
+        return distances
+
+    def _walk(self, distances):
+        """Alive targets in increasing distance order"""
+
+        for index in numpy.argsort(distances):
+            if distances[index] == numpy.inf:
+                return
+            if self._targets[index].alive():
+                yield self._targets[index]
+
+    def nearest(self, point, exclude=None):
+        """Closest alive target.
+
+        Arguments:
+            point {tuple: float} -- [x, y] position
+            exclude {object} -- target to ignore, usually the owner
+
+        Returns:
+            object -- closest target, None if there are no targets"""
+
+        distances = self._distances(point, exclude)
+        while len(distances):
+            index = numpy.argmin(distances)
+            if distances[index] == numpy.inf:
+                break
+            if self._targets[index].alive():
+                return self._targets[index]
+            distances[index] = numpy.inf
+        return None
+
+    def k_nearest(self, point, k, exclude=None):
+        """k closest alive targets.
+
+        Arguments:
+            point {tuple: float} -- [x, y] position
+            k {int} -- number of targets
+            exclude {object} -- target to ignore, usually the owner
+
+        Returns:
+            list -- targets sorted by distance"""
+
+        targets = []
+        for target in self._walk(self._distances(point, exclude)):
+            targets.append(target)
+            if len(targets) == k:
+                break
+        return targets
+
+    def nearest_many(self, points, exclude=None):
+        """Closest alive target of each point, as nearest. Small batches compute every
+        distance in one matrix, larger ones search a grid of the targets: each query only
+        looks at the cells around its point and temporaries do not grow with the targets.
+
+        Arguments:
+            points {array: float} -- [[x, y], ...] positions
+            exclude {list: object} -- target to ignore for each point, or None
+
+        Returns:
+            list -- closest target of each point, None where there are no targets"""
+
+        if self._stale:
+            self._build()
+        points = numpy.asarray(points, numpy.float64).reshape(-1, 2)
+        if not len(self._targets):
+            return [None] * len(points)
+        excluded = exclude if exclude is not None else [None] * len(points)
+        if len(points) * len(self._targets) > MATRIX_PAIRS:
+            if self._cells is None:
+                self._build_grid()
+            return [self._grid_nearest(point, owner) for point, owner in zip(points, excluded)]
+
+        distances = ((points[:, None, :] - self._positions[None, :, :]) ** 2).sum(axis=2)
+        nearest = []
+        for point, owner, target_index in zip(points, excluded,
+                                              numpy.argmin(distances, axis=1).tolist()):
+            target = self._targets[target_index]
+            if target is owner or not target.alive():
+                # the batch choice is not valid, fall back to the single query
+                target = self.nearest(point, owner)
+            nearest.append(target)
+        return nearest
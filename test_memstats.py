@@ -0,0 +1,55 @@
+import os
+import random
+import unittest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+import game_mode
+import memstats
+
+
+class LeakDetectionTest(unittest.TestCase):
+    """Killed objects reported by MemoryStats.sample"""
+
+    @classmethod
+    def setUpClass(cls):
+        pygame.init()
+
+    def setUp(self):
+        random.seed(1)
+        self.game = game_mode.TestGame((2500, 2500), (1300, 800), False, 0)
+        self.game.simulate(10)
+        self.stats = memstats.MemoryStats(self.game, trace=False)
+
+    def tearDown(self):
+        self.stats.close()
+
+    def test_killed_during_step_not_reported(self):
+        asteroid = next(iter(self.game.asteroids))
+        asteroid.kill()
+        # still in the caches of the step, until the next one
+        self.assertIn(asteroid, self.game.lod._intervals)
+        sample = self.stats.sample()
+        self.assertEqual(sample["leaks"], [])
+        self.assertEqual(sample["held"], [])
+
+    def test_killed_player_held_by_roles(self):
+        self.game.user.kill()
+        sample = self.stats.sample()
+        self.assertEqual(sample["leaks"], [])
+        self.assertEqual(sample["held"], [{"class": "Ship",
+                                           "referrers": ["TestGame.camera_target",
+                                                         "TestGame.user"]}])
+
+    def test_retained_object_reported(self):
+        asteroid = next(iter(self.game.asteroids))
+        asteroid.kill()
+        self.game.graveyard = [asteroid]
+        sample = self.stats.sample()
+        self.assertEqual(sample["leaks"], [{"class": type(asteroid).__name__,
+                                            "referrers": ["TestGame.graveyard"]}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import collections
+
+
+class TextCache:
+    """Text rendering with cached results.
+    Whole strings are rendered once and kept in a LRU cache, numbers and other changing
+    text can be composed from a glyph atlas without rendering anything.
+
+    Arguments:
+        font {object} -- pygame font
+        capacity {int} -- max number of rendered strings kept"""
+
+    def __init__(self, font, capacity=1024):
+        self._font = font
+        self._capacity = capacity
+        self._strings = collections.OrderedDict() # (text, color) -> surface
+        self._glyphs = {} # (character, color) -> (surface, advance)
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, color=(255, 255, 0)):
+        """Rendered text, from the cache when already rendered.
+
+        Arguments:
+            text {str} -- single line text
+            color {tuple: int} -- RGB color
+
+        Returns:
+            object -- pygame surface"""
+
+        key = (text, color)
+        surface = self._strings.get(key)
+        if surface is not None:
+            self.hits += 1
+            self._strings.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self._font.render(text, 1, color)
+        self._strings[key] = surface
+        if len(self._strings) > self._capacity:
+            self._strings.popitem(last=False)
+        return surface
+
+    def glyphs(self, text, position, color=(255, 255, 0)):
+        """Compose text from the glyph atlas, kerning is ignored.
+
+        Arguments:
+            text {str} -- single line text
+            position {tuple: float} -- [x, y] screen position of the text
+            color {tuple: int} -- RGB color
+
+        Returns:
+            list -- (surface, position) of every glyph, ready for Renderer.blits"""
+
+        x, y = position
+        blits = []
+        for character in text:
+            glyph = self._glyphs.get((character, color))
+            if glyph is None:
+                surface = self._font.render(character, 1, color)
+                glyph = self._glyphs[(character, color)] = (surface, surface.get_width())
+            blits.append((glyph[0], (x, y)))
+            x += glyph[1]
+        return blits